@@ -17,8 +17,7 @@ from services.vapi_service import VAPIService
 from services.pdf_service import PDFService
 from services.session_manager import SessionManager
 from models.session_data import SessionData
-from utils.security import SecurityUtils
-from utils.file_handler import FileHandler
+from utils.file_handler import get_file_handler
 from config.settings import Settings
 
 # Initialize services
@@ -523,8 +522,8 @@ def show_upload_interface(services):
             if uploaded_transcript.type == "application/pdf":
                 if st.button("Preview PDF Content", key="preview_pdf", use_container_width=True):
                     try:
-                        from utils.file_handler import FileHandler
-                        file_handler = FileHandler()
+                        from utils.file_handler import get_file_handler
+                        file_handler = get_file_handler()
                         preview_text = file_handler.extract_text_from_file(uploaded_transcript)
                         
                         if preview_text:
@@ -733,8 +732,8 @@ def process_transcript_file(services, uploaded_file):
     """Process uploaded transcript file"""
     temp_file_path = None
     try:
-        from utils.file_handler import FileHandler
-        file_handler = FileHandler()
+        from utils.file_handler import get_file_handler
+        file_handler = get_file_handler()
         
         # Validate file type and size
         if not file_handler.is_supported_text_file(uploaded_file):
@@ -1040,7 +1039,7 @@ def show_google_recordings(services):
                                     audio_file = services['google_meet'].download_recording(recording)
                                     if audio_file:
                                         # Process the downloaded audio
-                                        transcript = services['transcription'].transcribe_audio(audio_file)
+                                        transcript = services['transcription'].transcribe_audio_with_status(audio_file)
                                         if transcript:
                                             analysis = services['analysis'].analyze_session(transcript)
                                             st.session_state.analysis_results = analysis
@@ -1083,7 +1082,7 @@ def show_teams_recordings(services):
                                     audio_file = services['teams'].download_recording(recording)
                                     if audio_file:
                                         # Process the downloaded audio
-                                        transcript = services['transcription'].transcribe_audio(audio_file)
+                                        transcript = services['transcription'].transcribe_audio_with_status(audio_file)
                                         if transcript:
                                             analysis = services['analysis'].analyze_session(transcript)
                                             st.session_state.analysis_results = analysis
@@ -1127,7 +1126,7 @@ def process_uploaded_file(services, uploaded_file):
             
             # Transcribe
             st.info("Transcribing audio...")
-            transcript = services['transcription'].transcribe_audio(file_path)
+            transcript = services['transcription'].transcribe_audio_with_status(file_path)
             
             if not transcript:
                 st.error("Transcription failed. Please try again or use a different file.")
@@ -1148,6 +1147,8 @@ def process_uploaded_file(services, uploaded_file):
                 analysis=analysis_results,
                 timestamp=datetime.now()
             )
+            # Lets deleting the session also purge its cached transcripts
+            session_data.metadata['audio_fingerprint'] = services['transcription'].audio_fingerprint(file_path)
             
             services['session_manager'].save_session(session_data)
             st.session_state.current_session = session_data
@@ -1229,8 +1230,8 @@ def show_dashboard(services):
     """Show main dashboard"""
     st.header("Session Dashboard")
     
-    # Recent sessions
-    sessions = services['session_manager'].get_recent_sessions()
+    # Recent sessions (listing only; the selected one is decrypted below)
+    sessions = services['session_manager'].list_sessions_meta(limit=10)
     
     if not sessions:
         st.info("No sessions processed yet. Upload an audio file or detect sessions from your platform.")
@@ -1238,12 +1239,12 @@ def show_dashboard(services):
     
     # Session selection
     session_options = {
-        f"Session {i+1} - {session.timestamp.strftime('%Y-%m-%d %H:%M')}": session
+        f"Session {i+1} - {session['timestamp'].strftime('%Y-%m-%d %H:%M')}": session['id']
         for i, session in enumerate(sessions)
     }
     
     selected_session_key = st.selectbox("Select Session", list(session_options.keys()))
-    selected_session = session_options[selected_session_key]
+    selected_session = services['session_manager'].load_session(session_options[selected_session_key])
     
     if selected_session:
         st.session_state.current_session = selected_session
@@ -2062,7 +2063,7 @@ def show_reports(services):
         with st.spinner("Generating report..."):
             try:
                 # Generate PDF
-                pdf_path = services['pdf'].generate_report(
+                pdf_bytes = services['pdf'].generate_report(
                     st.session_state.current_session,
                     report_type=report_type,
                     include_transcript=include_transcript,
@@ -2071,15 +2072,15 @@ def show_reports(services):
                 )
                 
                 # Offer download
-                with open(pdf_path, 'rb') as pdf_file:
+                if pdf_bytes:
                     st.download_button(
                         label="Download PDF Report",
-                        data=pdf_file.read(),
+                        data=pdf_bytes,
                         file_name=f"therapy_report_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
                         mime="application/pdf"
                     )
-                
-                st.success("Report generated successfully!")
+                    
+                    st.success("Report generated successfully!")
                 
             except Exception as e:
                 st.error(f"Report generation error: {str(e)}")
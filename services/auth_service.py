@@ -3,11 +3,11 @@ import streamlit as st
 import requests
 from datetime import datetime, timedelta
 import json
-from utils.security import SecurityUtils
+from utils.security import get_security_utils
 
 class AuthService:
     def __init__(self):
-        self.security = SecurityUtils()
+        self.security = get_security_utils()
         self.zoom_client_id = os.getenv("ZOOM_CLIENT_ID")
         self.zoom_client_secret = os.getenv("ZOOM_CLIENT_SECRET")
         self.google_client_id = os.getenv("GOOGLE_CLIENT_ID")
@@ -149,3 +149,19 @@ class AuthService:
             tokens = self._load_tokens()
             return tokens[platform]['access_token']
         return None
+    
+    def get_token_with_expiry(self, platform):
+        """Get valid token for platform along with its expiry time"""
+        try:
+            token_data = self._load_tokens().get(platform)
+            if not token_data:
+                return None, None
+            
+            expires_at = datetime.fromisoformat(token_data['expires_at'])
+            if datetime.now() >= expires_at:
+                return None, None
+            
+            return token_data['access_token'], expires_at
+            
+        except Exception:
+            return None, None
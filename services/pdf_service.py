@@ -1,5 +1,4 @@
 import os
-import json
 from datetime import datetime
 import streamlit as st
 from reportlab.lib.pagesizes import letter, A4
@@ -9,10 +8,45 @@ from reportlab.lib.colors import HexColor
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.platypus.flowables import Image
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 from io import BytesIO
-import base64
+from functools import lru_cache
+from xml.sax.saxutils import escape as _esc
+
+
+@lru_cache(maxsize=256)
+def _esc_cached(text):
+    """Escape frequently repeated labels (framework and key names) once"""
+    return _esc(text)
+
+
+@lru_cache(maxsize=64)
+def _pretty(key):
+    """Turn a snake_case analysis key into a display label"""
+    return key.replace('_', ' ').title()
+
+
+# Domain descriptions
+_DOMAIN_DESCRIPTIONS = {
+    'emotional_safety': 'Emotional Safety & Relational Depth (Rogers)',
+    'unconscious_patterns': 'Unconscious Pattern Emergence (Freud, Klein)',
+    'cognitive_restructuring': 'Cognitive Restructuring (Ellis, Beck)',
+    'communication_changes': 'Communication/Family Role Changes (Satir)',
+    'strengths_wellbeing': 'Strengths and Well-being (Seligman)',
+    'narrative_coherence': 'Narrative/Identity Coherence',
+    'behavioral_activation': 'Behavioral Activation in Real Life'
+}
+
+# Framework display names
+_FRAMEWORK_NAMES = {
+    'rogers': 'Person-Centered Approach (Rogers)',
+    'psychodynamic': 'Psychodynamic Approach (Freud, Klein)',
+    'cognitive': 'Cognitive Behavioral Approach (Ellis, Beck)',
+    'family_systems': 'Family Systems Approach (Satir)',
+    'positive_psychology': 'Positive Psychology Approach (Seligman)',
+    'narrative': 'Narrative Therapy Approach',
+    'behavioral': 'Behavioral Activation Approach'
+}
+
 
 class PDFService:
     def __init__(self):
@@ -60,20 +94,29 @@ class PDFService:
     
     def generate_report(self, session_data, report_type="Single Session Report", 
                        include_transcript=False, include_recommendations=True,
-                       include_visualizations=True):
-        """Generate comprehensive PDF report"""
+                       include_visualizations=True, out=None, save_to_disk=False):
+        """Generate comprehensive PDF report
+        
+        By default the report is rendered in memory and returned as bytes.
+        Pass a writable binary buffer as ``out`` to render into it instead
+        (the buffer is returned), or ``save_to_disk=True`` to keep the legacy
+        behaviour of writing to ``reports/`` and returning the file path.
+        """
         try:
-            # Create filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"therapeutic_report_{timestamp}.pdf"
-            filepath = f"reports/{filename}"
-            
-            # Create directory if it doesn't exist
-            os.makedirs('reports', exist_ok=True)
+            if save_to_disk:
+                # Create filename
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                filename = f"therapeutic_report_{timestamp}.pdf"
+                target = f"reports/{filename}"
+                
+                # Create directory if it doesn't exist
+                os.makedirs('reports', exist_ok=True)
+            else:
+                target = out if out is not None else BytesIO()
             
             # Create PDF document
             doc = SimpleDocTemplate(
-                filepath,
+                target,
                 pagesize=A4,
                 rightMargin=72,
                 leftMargin=72,
@@ -114,7 +157,9 @@ class PDFService:
             # Build PDF
             doc.build(story)
             
-            return filepath
+            if save_to_disk or out is not None:
+                return target
+            return target.getvalue()
             
         except Exception as e:
             st.error(f"PDF generation error: {str(e)}")
@@ -130,7 +175,7 @@ class PDFService:
         story.append(Spacer(1, 0.5*inch))
         
         # Report type
-        report_type_p = Paragraph(f"<b>{report_type}</b>", self.styles['CustomHeading'])
+        report_type_p = Paragraph(f"<b>{_esc(str(report_type))}</b>", self.styles['CustomHeading'])
         story.append(report_type_p)
         story.append(Spacer(1, 0.3*inch))
         
@@ -168,6 +213,14 @@ class PDFService:
     
     def _create_executive_summary(self, session_data):
         """Create executive summary section"""
+        analysis = session_data.analysis
+        domain_scores = analysis.get('domain_scores', {})
+        key_insights = analysis.get('key_insights', [])
+        
+        # Nothing to summarize
+        if not domain_scores and not key_insights:
+            return []
+        
         story = []
         
         # Section title
@@ -175,9 +228,6 @@ class PDFService:
         story.append(title)
         
         # Overall assessment
-        analysis = session_data.analysis
-        domain_scores = analysis.get('domain_scores', {})
-        
         # Calculate overall score
         overall_score = sum(domain_scores.values()) / len(domain_scores) if domain_scores else 0
         
@@ -192,11 +242,10 @@ class PDFService:
         story.append(Spacer(1, 0.2*inch))
         
         # Key highlights
-        key_insights = analysis.get('key_insights', [])
         if key_insights:
             story.append(Paragraph("<b>Key Highlights:</b>", self.styles['CustomBody']))
             for insight in key_insights[:3]:  # Top 3 insights
-                story.append(Paragraph(f"• {insight}", self.styles['CustomBullet']))
+                story.append(Paragraph(f"• {_esc(str(insight))}", self.styles['CustomBullet']))
         
         story.append(Spacer(1, 0.3*inch))
         
@@ -204,31 +253,21 @@ class PDFService:
     
     def _create_domain_analysis(self, session_data):
         """Create detailed domain analysis"""
+        domain_scores = session_data.analysis.get('domain_scores', {})
+        if not domain_scores:
+            return []
+        
         story = []
         
         # Section title
         title = Paragraph("Therapeutic Domain Analysis", self.styles['CustomHeading'])
         story.append(title)
         
-        analysis = session_data.analysis
-        domain_scores = analysis.get('domain_scores', {})
-        
-        # Domain descriptions
-        domain_descriptions = {
-            'emotional_safety': 'Emotional Safety & Relational Depth (Rogers)',
-            'unconscious_patterns': 'Unconscious Pattern Emergence (Freud, Klein)',
-            'cognitive_restructuring': 'Cognitive Restructuring (Ellis, Beck)',
-            'communication_changes': 'Communication/Family Role Changes (Satir)',
-            'strengths_wellbeing': 'Strengths and Well-being (Seligman)',
-            'narrative_coherence': 'Narrative/Identity Coherence',
-            'behavioral_activation': 'Behavioral Activation in Real Life'
-        }
-        
         # Create table for domain scores
         domain_data = [['Domain', 'Score', 'Assessment']]
         
         for domain, score in domain_scores.items():
-            description = domain_descriptions.get(domain, domain.replace('_', ' ').title())
+            description = _DOMAIN_DESCRIPTIONS.get(domain) or _pretty(domain)
             assessment = self._get_score_assessment(score)
             domain_data.append([description, f"{score}/10", assessment])
         
@@ -252,6 +291,9 @@ class PDFService:
     
     def _create_visualizations(self, session_data):
         """Create visualization section"""
+        if not session_data.analysis.get('domain_scores'):
+            return []
+        
         story = []
         
         # Section title
@@ -271,55 +313,48 @@ class PDFService:
     
     def _create_detailed_insights(self, session_data):
         """Create detailed insights section"""
+        analysis = session_data.analysis
+        themes = analysis.get('session_themes', [])
+        progress_indicators = analysis.get('progress_indicators', [])
+        detailed_analysis = analysis.get('detailed_analysis', {})
+        
+        # Skip the section entirely when there is nothing to report
+        if not any([themes, progress_indicators, detailed_analysis]):
+            return []
+        
         story = []
         
         # Section title
         title = Paragraph("Detailed Insights", self.styles['CustomHeading'])
         story.append(title)
         
-        analysis = session_data.analysis
-        
         # Session themes
-        themes = analysis.get('session_themes', [])
         if themes:
             story.append(Paragraph("<b>Session Themes:</b>", self.styles['CustomBody']))
             for theme in themes:
-                story.append(Paragraph(f"• {theme}", self.styles['CustomBullet']))
+                story.append(Paragraph(f"• {_esc(str(theme))}", self.styles['CustomBullet']))
             story.append(Spacer(1, 0.2*inch))
         
         # Progress indicators
-        progress_indicators = analysis.get('progress_indicators', [])
         if progress_indicators:
             story.append(Paragraph("<b>Progress Indicators:</b>", self.styles['CustomBody']))
             for indicator in progress_indicators:
-                story.append(Paragraph(f"• {indicator}", self.styles['CustomBullet']))
+                story.append(Paragraph(f"• {_esc(str(indicator))}", self.styles['CustomBullet']))
             story.append(Spacer(1, 0.2*inch))
         
         # Detailed analysis by framework
-        detailed_analysis = analysis.get('detailed_analysis', {})
-        
-        framework_names = {
-            'rogers': 'Person-Centered Approach (Rogers)',
-            'psychodynamic': 'Psychodynamic Approach (Freud, Klein)',
-            'cognitive': 'Cognitive Behavioral Approach (Ellis, Beck)',
-            'family_systems': 'Family Systems Approach (Satir)',
-            'positive_psychology': 'Positive Psychology Approach (Seligman)',
-            'narrative': 'Narrative Therapy Approach',
-            'behavioral': 'Behavioral Activation Approach'
-        }
-        
         for framework, data in detailed_analysis.items():
             if isinstance(data, dict) and 'score' in data:
-                framework_name = framework_names.get(framework, framework.replace('_', ' ').title())
-                story.append(Paragraph(f"<b>{framework_name}:</b>", self.styles['CustomBody']))
+                framework_name = _FRAMEWORK_NAMES.get(framework) or _pretty(framework)
+                story.append(Paragraph(f"<b>{_esc_cached(framework_name)}:</b>", self.styles['CustomBody']))
                 
                 # Add specific insights from this framework
                 for key, value in data.items():
                     if key != 'score' and isinstance(value, list) and value:
-                        key_name = key.replace('_', ' ').title()
-                        story.append(Paragraph(f"<i>{key_name}:</i>", self.styles['CustomBody']))
+                        key_name = _pretty(key)
+                        story.append(Paragraph(f"<i>{_esc_cached(key_name)}:</i>", self.styles['CustomBody']))
                         for item in value[:3]:  # Limit to top 3 items
-                            story.append(Paragraph(f"• {item}", self.styles['CustomBullet']))
+                            story.append(Paragraph(f"• {_esc(str(item))}", self.styles['CustomBullet']))
                 
                 story.append(Spacer(1, 0.15*inch))
         
@@ -344,7 +379,7 @@ class PDFService:
             story.append(Spacer(1, 0.1*inch))
             
             for i, rec in enumerate(recommendations, 1):
-                story.append(Paragraph(f"{i}. {rec}", self.styles['CustomBody']))
+                story.append(Paragraph(f"{i}. {_esc(str(rec))}", self.styles['CustomBody']))
                 story.append(Spacer(1, 0.05*inch))
         else:
             story.append(Paragraph(
@@ -371,7 +406,7 @@ class PDFService:
             paragraphs = transcript.split('\n\n')
             for paragraph in paragraphs:
                 if paragraph.strip():
-                    story.append(Paragraph(paragraph.strip(), self.styles['CustomBody']))
+                    story.append(Paragraph(_esc(paragraph.strip()), self.styles['CustomBody']))
                     story.append(Spacer(1, 0.1*inch))
         else:
             story.append(Paragraph("No transcript available.", self.styles['CustomBody']))
@@ -415,6 +450,9 @@ class PDFService:
     def _create_radar_chart(self, session_data):
         """Create radar chart for domain scores"""
         try:
+            # Imported lazily so matplotlib is only loaded when a chart is drawn
+            import matplotlib.pyplot as plt
+            
             analysis = session_data.analysis
             domain_scores = analysis.get('domain_scores', {})
             
@@ -441,7 +479,7 @@ class PDFService:
             
             # Add labels
             ax.set_xticks(angles[:-1])
-            ax.set_xticklabels([cat.replace('_', ' ').title() for cat in categories])
+            ax.set_xticklabels([_pretty(cat) for cat in categories])
             ax.set_ylim(0, 10)
             ax.set_yticks([2, 4, 6, 8, 10])
             ax.set_yticklabels(['2', '4', '6', '8', '10'])
@@ -1,30 +1,237 @@
 import os
-import json
-import pickle
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from datetime import datetime
 from typing import List, Dict, Any
+from uuid import uuid4
 import streamlit as st
 from models.session_data import SessionData
-from utils.security import SecurityUtils
+from services.transcription_service import purge_cached_transcripts
+from utils.security import get_security_utils
+from utils import json_utils
+
+# Unencrypted per-session aggregates used for statistics, plus the audio
+# fingerprint keying cached transcripts (no transcript or PII)
+_SUMMARY_COLUMNS = {
+    'platform': 'TEXT',
+    'domain_scores': 'BLOB',
+    'audio_fingerprint': 'TEXT'
+}
 
 class SessionManager:
+    # Directories only need creating once per process
+    _dirs_ready = False
+    
     def __init__(self):
-        self.security = SecurityUtils()
+        self.security = get_security_utils()
         self.sessions_dir = "sessions"
+        self.store_path = os.path.join(self.sessions_dir, "store.db")
+        self.temp_dir = "temp"
         self.settings_file = "settings.json"
+        
+        # Decrypted sessions keyed by session ID, least recently used first
+        self._cache: "OrderedDict[str, SessionData]" = OrderedDict()
+        self._cache_cap = 256
+        self._cache_lock = threading.Lock()
+        
         self._ensure_directories()
+        self._init_store()
     
     def _ensure_directories(self):
         """Ensure required directories exist"""
-        directories = [self.sessions_dir, "recordings", "reports", "temp"]
+        if SessionManager._dirs_ready:
+            return
+        
+        directories = [self.sessions_dir, "recordings", "reports", self.temp_dir]
         for directory in directories:
             os.makedirs(directory, exist_ok=True)
+        
+        SessionManager._dirs_ready = True
+    
+    def _connect(self):
+        """Open a connection to the encrypted session store"""
+        conn = sqlite3.connect(self.store_path)
+        # Safe with WAL: a crash can lose the last commit but never corrupt the store
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return closing(conn)
+    
+    def _init_store(self):
+        """Create the session store and import any legacy per-file sessions"""
+        try:
+            with self._connect() as conn, conn:
+                # Saves append to the write-ahead log instead of rewriting pages in place
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions ("
+                    "id TEXT PRIMARY KEY, ts REAL NOT NULL, ciphertext BLOB NOT NULL)"
+                )
+                
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_ts ON sessions (ts)")
+                
+                # Add summary columns to stores created before they existed
+                existing = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+                for column, column_type in _SUMMARY_COLUMNS.items():
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {column_type}")
+            
+            self._migrate_legacy_sessions()
+            self._backfill_summaries()
+            
+        except Exception as e:
+            st.error(f"Session store initialization error: {str(e)}")
+    
+    def _migrate_legacy_sessions(self):
+        """Move sessions saved as individual .enc files into the store"""
+        index_file = os.path.join(self.sessions_dir, "index.json")
+        legacy_files = [
+            entry for entry in os.scandir(self.sessions_dir)
+            if entry.is_file() and entry.name.endswith('.enc')
+        ]
+        if not legacy_files and not os.path.exists(index_file):
+            return
+        
+        legacy_index = {}
+        if os.path.exists(index_file):
+            with open(index_file, 'rb') as f:
+                legacy_index = json_utils.loads(f.read())
+        
+        rows = []
+        for entry in legacy_files:
+            session_id = entry.name[:-len('.enc')]
+            timestamp = legacy_index.get(session_id, {}).get('timestamp')
+            timestamp = (
+                datetime.fromisoformat(timestamp).timestamp() if timestamp
+                else entry.stat().st_mtime
+            )
+            with open(entry.path, 'rb') as f:
+                rows.append((session_id, timestamp, f.read()))
+        
+        # Ciphertext is copied as-is, so no decryption is needed here
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO sessions (id, ts, ciphertext) VALUES (?, ?, ?)",
+                rows
+            )
+        
+        for entry in legacy_files:
+            os.remove(entry.path)
+        if os.path.exists(index_file):
+            os.remove(index_file)
+    
+    def _cache_get(self, session_id: str):
+        """Return a cached session, marking it as recently used"""
+        with self._cache_lock:
+            session_data = self._cache.get(session_id)
+            if session_data is not None:
+                self._cache.move_to_end(session_id)
+            return session_data
+    
+    def _cache_put(self, session_id: str, session_data: SessionData):
+        """Cache a session, evicting the least recently used one when full"""
+        with self._cache_lock:
+            self._cache[session_id] = session_data
+            self._cache.move_to_end(session_id)
+            if len(self._cache) > self._cache_cap:
+                self._cache.popitem(last=False)
+    
+    def clear_cache(self):
+        """Drop all cached sessions so the next reads go to the store"""
+        with self._cache_lock:
+            self._cache.clear()
     
-    def save_session(self, session_data: SessionData) -> str:
-        """Save session data securely"""
+    def _backfill_summaries(self):
+        """Fill summary columns for rows stored before they were tracked"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, ciphertext FROM sessions WHERE domain_scores IS NULL"
+            ).fetchall()
+        if not rows:
+            return
+        
+        sessions = self._sessions_from_rows(rows)
+        with self._connect() as conn, conn:
+            conn.executemany(
+                "UPDATE sessions SET platform = ?, domain_scores = ? WHERE id = ?",
+                [
+                    (session.platform,
+                     json_utils.dumps(session.analysis.get('domain_scores', {})),
+                     session.id)
+                    for session in sessions
+                ]
+            )
+    
+    # The two decode helpers run once per session when listing, so their
+    # globals are bound as defaults to make each lookup a local one
+    def _session_from_ciphertext(self, encrypted_data: bytes,
+                                 _loads=json_utils.loads) -> SessionData:
+        """Decrypt a stored session and rebuild the SessionData object"""
+        # Raised rather than shown: this also runs on pool threads, which have
+        # no script context, so the caller reports the failure
+        decrypted_data = self.security.decrypt_data(encrypted_data, raise_errors=True)
+        return self._session_from_dict(_loads(decrypted_data))
+    
+    def _session_from_dict(self, session_dict: Dict[str, Any],
+                           _session_cls=SessionData,
+                           _fromisoformat=datetime.fromisoformat) -> SessionData:
+        """Rebuild a SessionData object from its stored dictionary"""
+        # Reconstruct SessionData object
+        session_data = _session_cls(
+            file_path=session_dict['file_path'],
+            transcript=session_dict['transcript'],
+            analysis=session_dict['analysis'],
+            timestamp=_fromisoformat(session_dict['timestamp'])
+        )
+        
+        # Add additional attributes
+        session_data.id = session_dict['id']
+        session_data.platform = session_dict.get('platform', 'manual')
+        session_data.metadata = session_dict.get('metadata', {})
+        
+        return session_data
+    
+    def _decrypt_row(self, row):
+        """Decrypt one (id, ciphertext) row, returning (session, error)"""
+        session_id, encrypted_data = row
+        session_data = self._cache_get(session_id)
+        if session_data is not None:
+            return session_data, None
+        try:
+            session_data = self._session_from_ciphertext(encrypted_data)
+        except Exception as e:
+            # InvalidTag and InvalidToken carry no message
+            return None, f"{session_id}: {str(e) or type(e).__name__}"
+        self._cache_put(session_id, session_data)
+        return session_data, None
+    
+    def _sessions_from_rows(self, rows) -> List[SessionData]:
+        """Decrypt (id, ciphertext) rows, reusing cached sessions and skipping failures"""
+        if len(rows) > 1:
+            # Decryption runs in C and releases the GIL, so rows decrypt in parallel
+            max_workers = min(32, (os.cpu_count() or 1) * 4, len(rows))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(self._decrypt_row, rows))
+        else:
+            results = [self._decrypt_row(row) for row in rows]
+        
+        sessions = [session_data for session_data, _ in results if session_data is not None]
+        
+        # Streamlit elements can only be written from the script thread
+        errors = [error for _, error in results if error]
+        if errors:
+            st.error(f"Failed to load {len(errors)} session(s): {'; '.join(errors)}")
+        
+        return sessions
+    
+    def save_session(self, session_data: SessionData, quiet: bool = False) -> str:
+        """Save session data securely (quiet skips the success message for batch saves)"""
         try:
             # Generate unique session ID
-            session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            session_id = f"session_{uuid4().hex[:16]}"
             
             # Prepare session data for storage
             session_dict = {
@@ -38,17 +245,24 @@ class SessionManager:
             }
             
             # Encrypt sensitive data
-            encrypted_data = self.security.encrypt_data(json.dumps(session_dict))
-            
-            # Save to file
-            session_file = os.path.join(self.sessions_dir, f"{session_id}.enc")
-            with open(session_file, 'wb') as f:
-                f.write(encrypted_data)
-            
-            # Update session index
-            self._update_session_index(session_id, session_data.timestamp)
-            
-            st.success(f"Session saved successfully: {session_id}")
+            encrypted_data = self.security.encrypt_data(json_utils.dumps(session_dict))
+            
+            # Save to the session store
+            with self._connect() as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions "
+                    "(id, ts, ciphertext, platform, domain_scores, audio_fingerprint) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, session_data.timestamp.timestamp(), encrypted_data,
+                     session_dict['platform'],
+                     json_utils.dumps(session_dict['analysis'].get('domain_scores', {})),
+                     session_dict['metadata'].get('audio_fingerprint'))
+                )
+            
+            self._cache_put(session_id, self._session_from_dict(session_dict))
+            
+            if not quiet:
+                st.success(f"Session saved successfully: {session_id}")
             return session_id
             
         except Exception as e:
@@ -58,57 +272,63 @@ class SessionManager:
     def load_session(self, session_id: str) -> SessionData:
         """Load session data"""
         try:
-            session_file = os.path.join(self.sessions_dir, f"{session_id}.enc")
+            session_data = self._cache_get(session_id)
+            if session_data is not None:
+                return session_data
             
-            if not os.path.exists(session_file):
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT ciphertext FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+            
+            if row is None:
                 st.error(f"Session not found: {session_id}")
                 return None
             
-            # Read and decrypt data
-            with open(session_file, 'rb') as f:
-                encrypted_data = f.read()
-            
-            decrypted_data = self.security.decrypt_data(encrypted_data)
-            session_dict = json.loads(decrypted_data)
-            
-            # Reconstruct SessionData object
-            session_data = SessionData(
-                file_path=session_dict['file_path'],
-                transcript=session_dict['transcript'],
-                analysis=session_dict['analysis'],
-                timestamp=datetime.fromisoformat(session_dict['timestamp'])
-            )
-            
-            # Add additional attributes
-            session_data.id = session_dict['id']
-            session_data.platform = session_dict.get('platform', 'manual')
-            session_data.metadata = session_dict.get('metadata', {})
-            
+            session_data = self._session_from_ciphertext(row[0])
+            self._cache_put(session_id, session_data)
             return session_data
             
         except Exception as e:
             st.error(f"Failed to load session: {str(e)}")
             return None
     
+    def list_sessions_meta(self, limit: int = None) -> List[Dict[str, Any]]:
+        """List session summaries (most recent first) without decrypting anything"""
+        try:
+            query = "SELECT id, ts, platform, domain_scores FROM sessions ORDER BY ts DESC"
+            params = ()
+            if limit is not None:
+                query += " LIMIT ?"
+                params = (limit,)
+            
+            with self._connect() as conn:
+                rows = conn.execute(query, params).fetchall()
+            
+            return [
+                {
+                    'id': session_id,
+                    'timestamp': datetime.fromtimestamp(ts),
+                    'platform': platform,
+                    'domain_scores': json_utils.loads(scores_json or b'{}')
+                }
+                for session_id, ts, platform, scores_json in rows
+            ]
+            
+        except Exception as e:
+            st.error(f"Failed to list sessions: {str(e)}")
+            return []
+    
     def get_recent_sessions(self, limit: int = 10) -> List[SessionData]:
         """Get recent sessions"""
         try:
-            session_index = self._load_session_index()
+            # Most recent first
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, ciphertext FROM sessions ORDER BY ts DESC LIMIT ?", (limit,)
+                ).fetchall()
             
-            # Sort by timestamp (most recent first)
-            sorted_sessions = sorted(
-                session_index.items(),
-                key=lambda x: x[1]['timestamp'],
-                reverse=True
-            )
-            
-            sessions = []
-            for session_id, _ in sorted_sessions[:limit]:
-                session_data = self.load_session(session_id)
-                if session_data:
-                    sessions.append(session_data)
-            
-            return sessions
+            return self._sessions_from_rows(rows)
             
         except Exception as e:
             st.error(f"Failed to load recent sessions: {str(e)}")
@@ -117,38 +337,36 @@ class SessionManager:
     def get_all_sessions(self) -> List[SessionData]:
         """Get all sessions"""
         try:
-            session_index = self._load_session_index()
-            
-            sessions = []
-            for session_id in session_index.keys():
-                session_data = self.load_session(session_id)
-                if session_data:
-                    sessions.append(session_data)
+            # Sorted by timestamp
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, ciphertext FROM sessions ORDER BY ts"
+                ).fetchall()
             
-            # Sort by timestamp
-            sessions.sort(key=lambda x: x.timestamp)
-            
-            return sessions
+            return self._sessions_from_rows(rows)
             
         except Exception as e:
             st.error(f"Failed to load all sessions: {str(e)}")
             return []
     
-    def delete_session(self, session_id: str) -> bool:
-        """Delete a session"""
+    def delete_session(self, session_id: str, quiet: bool = False) -> bool:
+        """Delete a session (quiet skips the success message for batch deletes)"""
         try:
-            session_file = os.path.join(self.sessions_dir, f"{session_id}.enc")
+            with self._connect() as conn, conn:
+                row = conn.execute(
+                    "SELECT audio_fingerprint FROM sessions WHERE id = ?", (session_id,)
+                ).fetchone()
+                conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
             
-            if os.path.exists(session_file):
-                os.remove(session_file)
+            with self._cache_lock:
+                self._cache.pop(session_id, None)
             
-            # Remove from index
-            session_index = self._load_session_index()
-            if session_id in session_index:
-                del session_index[session_id]
-                self._save_session_index(session_index)
+            # Cached transcripts of the recording go with the session
+            if row and row[0]:
+                purge_cached_transcripts(fingerprint=row[0])
             
-            st.success(f"Session deleted: {session_id}")
+            if not quiet:
+                st.success(f"Session deleted: {session_id}")
             return True
             
         except Exception as e:
@@ -161,11 +379,12 @@ class SessionManager:
             # Generate unique filename in temp directory
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"temp_{timestamp}_{uploaded_file.name}"
-            filepath = os.path.join("temp", filename)
+            filepath = os.path.join(self.temp_dir, filename)
             
-            # Save file temporarily
+            # Stream to disk in 1 MB chunks to keep memory flat for large recordings
+            uploaded_file.seek(0)
             with open(filepath, 'wb') as f:
-                f.write(uploaded_file.getbuffer())
+                shutil.copyfileobj(uploaded_file, f, length=1024 * 1024)
             
             return filepath
             
@@ -173,23 +392,24 @@ class SessionManager:
             st.error(f"Failed to save uploaded file: {str(e)}")
             return None
     
-    def cleanup_old_files(self, days_old: int = 30):
+    def cleanup_old_files(self, days_old: int = 30, quiet: bool = False):
         """Clean up old session files"""
         try:
-            cutoff_date = datetime.now().timestamp() - (days_old * 24 * 60 * 60)
-            
-            session_index = self._load_session_index()
-            sessions_to_delete = []
+            cutoff_date = time.time() - (days_old * 24 * 60 * 60)
             
-            for session_id, session_info in session_index.items():
-                session_timestamp = datetime.fromisoformat(session_info['timestamp']).timestamp()
-                if session_timestamp < cutoff_date:
-                    sessions_to_delete.append(session_id)
+            with self._connect() as conn:
+                sessions_to_delete = [
+                    row[0] for row in conn.execute(
+                        "SELECT id FROM sessions WHERE ts < ?", (cutoff_date,)
+                    )
+                ]
             
             for session_id in sessions_to_delete:
-                self.delete_session(session_id)
+                self.delete_session(session_id, quiet=True)
+            purge_cached_transcripts(max_age_days=days_old)
             
-            st.info(f"Cleaned up {len(sessions_to_delete)} old sessions")
+            if not quiet:
+                st.info(f"Cleaned up {len(sessions_to_delete)} old sessions")
             
         except Exception as e:
             st.error(f"Cleanup error: {str(e)}")
@@ -197,12 +417,9 @@ class SessionManager:
     def cleanup_temp_files(self):
         """Clean up all temporary files"""
         try:
-            temp_dir = "temp"
-            if os.path.exists(temp_dir):
-                for filename in os.listdir(temp_dir):
-                    filepath = os.path.join(temp_dir, filename)
-                    if os.path.isfile(filepath):
-                        os.remove(filepath)
+            # Remove the whole directory in one walk and recreate it empty
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            os.makedirs(self.temp_dir, exist_ok=True)
             
             st.info("Temporary files cleaned up for privacy")
             
@@ -233,8 +450,8 @@ class SessionManager:
             export_filename = f"sessions_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
             export_path = os.path.join("reports", export_filename)
             
-            with open(export_path, 'w') as f:
-                json.dump(export_data, f, indent=2)
+            with open(export_path, 'wb') as f:
+                f.write(json_utils.dumps(export_data, indent=True))
             
             return export_path
             
@@ -245,39 +462,37 @@ class SessionManager:
     def get_session_statistics(self) -> Dict[str, Any]:
         """Get session statistics"""
         try:
-            sessions = self.get_all_sessions()
+            # Only the unencrypted summary columns are read; nothing is decrypted
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT platform, ts, domain_scores FROM sessions ORDER BY ts"
+                ).fetchall()
             
-            if not sessions:
+            if not rows:
                 return {}
             
             # Calculate statistics
-            total_sessions = len(sessions)
+            total_sessions = len(rows)
             
-            # Average scores by domain
-            domain_scores = {}
-            for session in sessions:
-                scores = session.analysis.get('domain_scores', {})
-                for domain, score in scores.items():
-                    if domain not in domain_scores:
-                        domain_scores[domain] = []
-                    domain_scores[domain].append(score)
+            # Running (sum, count) per domain and platform distribution
+            domain_totals = defaultdict(lambda: [0.0, 0])
+            platform_counts = {}
+            for platform, _, scores_json in rows:
+                for domain, score in json_utils.loads(scores_json or b'{}').items():
+                    totals = domain_totals[domain]
+                    totals[0] += score
+                    totals[1] += 1
+                platform_counts[platform] = platform_counts.get(platform, 0) + 1
             
             avg_domain_scores = {
-                domain: sum(scores) / len(scores)
-                for domain, scores in domain_scores.items()
+                domain: total / count
+                for domain, (total, count) in domain_totals.items()
             }
             
-            # Platform distribution
-            platform_counts = {}
-            for session in sessions:
-                platform = getattr(session, 'platform', 'manual')
-                platform_counts[platform] = platform_counts.get(platform, 0) + 1
-            
             # Date range
-            timestamps = [session.timestamp for session in sessions]
             date_range = {
-                'earliest': min(timestamps).isoformat(),
-                'latest': max(timestamps).isoformat()
+                'earliest': datetime.fromtimestamp(rows[0][1]).isoformat(),
+                'latest': datetime.fromtimestamp(rows[-1][1]).isoformat()
             }
             
             return {
@@ -295,8 +510,8 @@ class SessionManager:
     def save_settings(self, settings: Dict[str, Any]):
         """Save application settings"""
         try:
-            with open(self.settings_file, 'w') as f:
-                json.dump(settings, f, indent=2)
+            with open(self.settings_file, 'wb') as f:
+                f.write(json_utils.dumps(settings, indent=True))
             
         except Exception as e:
             st.error(f"Settings save error: {str(e)}")
@@ -305,45 +520,10 @@ class SessionManager:
         """Load application settings"""
         try:
             if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r') as f:
-                    return json.load(f)
+                with open(self.settings_file, 'rb') as f:
+                    return json_utils.loads(f.read())
             return {}
             
         except Exception as e:
             st.error(f"Settings load error: {str(e)}")
             return {}
-    
-    def _update_session_index(self, session_id: str, timestamp: datetime):
-        """Update session index"""
-        try:
-            session_index = self._load_session_index()
-            session_index[session_id] = {
-                'timestamp': timestamp.isoformat(),
-                'created': datetime.now().isoformat()
-            }
-            self._save_session_index(session_index)
-            
-        except Exception as e:
-            st.error(f"Index update error: {str(e)}")
-    
-    def _load_session_index(self) -> Dict[str, Any]:
-        """Load session index"""
-        try:
-            index_file = os.path.join(self.sessions_dir, "index.json")
-            if os.path.exists(index_file):
-                with open(index_file, 'r') as f:
-                    return json.load(f)
-            return {}
-            
-        except Exception as e:
-            return {}
-    
-    def _save_session_index(self, session_index: Dict[str, Any]):
-        """Save session index"""
-        try:
-            index_file = os.path.join(self.sessions_dir, "index.json")
-            with open(index_file, 'w') as f:
-                json.dump(session_index, f, indent=2)
-                
-        except Exception as e:
-            st.error(f"Index save error: {str(e)}")
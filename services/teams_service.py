@@ -1,26 +1,66 @@
+import os
+import shutil
+import time
 import requests
-import json
-from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import streamlit as st
 from services.auth_service import AuthService
+from utils import json_utils
+
+# Extensions Teams uses for meeting recordings
+_VIDEO_EXTS = ('.mp4', '.m4v', '.mov')
 
 class TeamsService:
     def __init__(self):
         self.auth_service = AuthService()
         self.base_url = "https://graph.microsoft.com/v1.0"
         
+        # Pooled session so consecutive Graph calls reuse the TLS connection
+        self._http = requests.Session()
+        self._http.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=(429, 500, 502, 503, 504)
+            )
+        ))
+        
+        # Cached OAuth token and the headers built from it
+        self._token = None
+        self._token_expiry = 0.0
+        self._headers = None
+        
+    def _auth_headers(self):
+        """Return Graph request headers, refreshing the cached token when near expiry"""
+        if self._headers is None or time.monotonic() >= self._token_expiry - 60:
+            token, expires_at = self.auth_service.get_token_with_expiry('teams')
+            if not token:
+                self._token = None
+                self._headers = None
+                return None
+            
+            ttl = (expires_at - datetime.now()).total_seconds()
+            self._token = token
+            self._token_expiry = time.monotonic() + ttl
+            self._headers = {
+                'Authorization': f'Bearer {token}',
+                'Content-Type': 'application/json'
+            }
+        
+        return self._headers
+    
     def get_recent_recordings(self, days_back=7):
         """Get recent Teams recordings via Graph API"""
         try:
-            token = self.auth_service.get_token('teams')
-            if not token:
+            headers = self._auth_headers()
+            if not headers:
                 st.error("Not authenticated with Teams")
                 return []
-                
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
             
             # Get recordings from OneDrive/SharePoint
             # Teams recordings are typically stored in the "Recordings" folder
@@ -31,10 +71,10 @@ class TeamsService:
                 '$filter': "name eq 'Recordings'"
             }
             
-            response = requests.get(url, headers=headers, params=params)
+            response = self._http.get(url, headers=headers, params=params)
             
             if response.status_code == 200:
-                data = response.json()
+                data = json_utils.loads(response.content)
                 recordings_folder = None
                 
                 for item in data.get('value', []):
@@ -58,29 +98,46 @@ class TeamsService:
     def _get_recordings_from_folder(self, folder_id, days_back):
         """Get recordings from specific folder"""
         try:
-            token = self.auth_service.get_token('teams')
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
+            headers = self._auth_headers()
+            
+            # Graph returns UTC ISO-8601 strings, which sort chronologically as text
+            cutoff_date = datetime.now(timezone.utc) - timedelta(days=days_back)
+            cutoff_iso = cutoff_date.strftime('%Y-%m-%dT%H:%M:%S')
             
+            # Let Graph filter by date and extension and return only the fields we use
             url = f"{self.base_url}/me/drive/items/{folder_id}/children"
-            response = requests.get(url, headers=headers)
+            params = {
+                '$filter': (
+                    f"createdDateTime ge {cutoff_iso}Z and "
+                    "(" + " or ".join(f"endswith(name,'{ext}')" for ext in _VIDEO_EXTS) + ")"
+                ),
+                '$select': 'id,name,createdDateTime,size,file,@microsoft.graph.downloadUrl',
+                '$top': 200,
+                '$orderby': 'createdDateTime desc'
+            }
             
-            if response.status_code == 200:
-                data = response.json()
-                recordings = []
-                
-                cutoff_date = datetime.now() - timedelta(days=days_back)
-                
+            recordings = []
+            while url:
+                response = self._http.get(url, headers=headers, params=params)
+                if 400 <= response.status_code < 500 and params and '$filter' in params:
+                    # Some drives reject $filter/$orderby on children; list
+                    # everything and rely on the local checks below instead
+                    st.warning(f"Graph rejected the recordings filter ({response.status_code}); listing all files instead")
+                    recordings = []
+                    url = f"{self.base_url}/me/drive/items/{folder_id}/children"
+                    params = {'$select': params['$select'], '$top': params['$top']}
+                    continue
+                if response.status_code != 200:
+                    st.error(f"Failed to list Teams recordings: {response.status_code}")
+                    break
+                
+                data = json_utils.loads(response.content)
+                
+                # Re-check locally in case the drive ignores part of the filter
                 for item in data.get('value', []):
-                    if item.get('file') and any(ext in item.get('name', '').lower() 
-                                              for ext in ['.mp4', '.m4v', '.mov']):
-                        created_time = datetime.fromisoformat(
-                            item.get('createdDateTime', '').replace('Z', '+00:00')
-                        )
-                        
-                        if created_time >= cutoff_date:
+                    if item.get('file') and item.get('name', '').lower().endswith(_VIDEO_EXTS):
+                        # Compare to the second without parsing each timestamp
+                        if item.get('createdDateTime', '')[:19] >= cutoff_iso:
                             recordings.append({
                                 'id': item.get('id'),
                                 'name': item.get('name'),
@@ -90,9 +147,13 @@ class TeamsService:
                                 'platform': 'teams'
                             })
                 
-                return recordings
-            else:
-                return []
+                # The next link already carries the query parameters
+                url = data.get('@odata.nextLink')
+                params = None
+            
+            # Newest first, which the unfiltered listing does not guarantee
+            recordings.sort(key=lambda r: r['created_time'] or '', reverse=True)
+            return recordings
                 
         except Exception as e:
             st.error(f"Folder access error: {str(e)}")
@@ -100,53 +161,65 @@ class TeamsService:
     
     def download_recording(self, recording_info):
         """Download a specific Teams recording"""
+        filepath, error = self._download_recording(recording_info)
+        if error:
+            st.error(error)
+        return filepath
+    
+    def download_recordings(self, recording_infos, max_workers=8):
+        """Download several Teams recordings concurrently, preserving order"""
+        if not recording_infos:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(recording_infos))) as executor:
+            results = list(executor.map(self._download_recording, recording_infos))
+        
+        # Streamlit elements can only be written from the script thread
+        errors = [error for _, error in results if error]
+        if errors:
+            st.error(f"Failed to download {len(errors)} recording(s): {'; '.join(errors)}")
+        
+        return [filepath for filepath, _ in results]
+    
+    def _download_recording(self, recording_info):
+        """Download one recording, returning (filepath, error message)"""
         try:
             if not recording_info.get('download_url'):
-                st.error("No download URL available")
-                return None
+                return None, "No download URL available"
+                
+            with self._http.get(recording_info['download_url'], stream=True) as response:
+                if response.status_code != 200:
+                    return None, f"Failed to download recording: {response.status_code}"
                 
-            response = requests.get(recording_info['download_url'], stream=True)
-            
-            if response.status_code == 200:
                 # Generate filename
                 filename = f"teams_recording_{recording_info['id']}.mp4"
                 filepath = f"recordings/{filename}"
                 
                 # Create directory if it doesn't exist
-                import os
                 os.makedirs('recordings', exist_ok=True)
                 
-                # Save file
+                # Copy straight from the socket in C, 1 MB at a time
+                response.raw.decode_content = True
                 with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+                    shutil.copyfileobj(response.raw, f, length=1 << 20)
                 
-                return filepath
-            else:
-                st.error(f"Failed to download recording: {response.status_code}")
-                return None
+                return filepath, None
                 
         except Exception as e:
-            st.error(f"Download error: {str(e)}")
-            return None
+            return None, f"Download error: {str(e)}"
     
     def get_meeting_details(self, meeting_id):
         """Get meeting details from Teams"""
         try:
-            token = self.auth_service.get_token('teams')
-            if not token:
+            headers = self._auth_headers()
+            if not headers:
                 return None
-                
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
             
             url = f"{self.base_url}/me/onlineMeetings/{meeting_id}"
-            response = requests.get(url, headers=headers)
+            response = self._http.get(url, headers=headers)
             
             if response.status_code == 200:
-                return response.json()
+                return json_utils.loads(response.content)
             else:
                 return None
                 
@@ -157,14 +230,9 @@ class TeamsService:
     def setup_webhook(self, webhook_url):
         """Setup webhook for Teams recording notifications"""
         try:
-            token = self.auth_service.get_token('teams')
-            if not token:
+            headers = self._auth_headers()
+            if not headers:
                 return False
-                
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
             
             subscription_data = {
                 'changeType': 'created,updated',
@@ -175,7 +243,7 @@ class TeamsService:
             }
             
             url = f"{self.base_url}/subscriptions"
-            response = requests.post(url, headers=headers, json=subscription_data)
+            response = self._http.post(url, headers=headers, data=json_utils.dumps(subscription_data))
             
             return response.status_code == 201
             
@@ -1,9 +1,62 @@
 import os
+import io
+import time
 import json
+import wave
+import queue
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import httpx
 import requests
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from pydub import AudioSegment
-from utils.audio_utils import AudioUtils
+from pydub.silence import detect_silence
+from utils.audio_utils import get_audio_utils
+from utils.http_utils import HTTP2_AVAILABLE, AdaptiveRateLimiter, request_with_backoff
+from utils.security import get_security_utils
+from utils import json_utils
+
+# Encrypted transcripts keyed by audio content, provider and model
+_TRANSCRIPT_CACHE_DIR = '.transcript_cache'
+
+# Cached transcripts older than this are deleted (TRANSCRIPT_CACHE_MAX_AGE_DAYS)
+_TRANSCRIPT_CACHE_MAX_AGE_DAYS = 30
+
+# Queue receiving (chunks done, chunk count) while a status box is watching
+_progress_queue = contextvars.ContextVar('transcription_progress', default=None)
+
+@lru_cache(maxsize=64)
+def _audio_fingerprint(file_path, mtime_ns, size):
+    """Content hash of a file; keyed on mtime and size so edits are picked up"""
+    return get_audio_utils().get_audio_fingerprint(file_path) or None
+
+
+def purge_cached_transcripts(fingerprint=None, max_age_days=None):
+    """Delete cached transcripts of one recording and/or those older than max_age_days"""
+    cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+    try:
+        entries = os.scandir(_TRANSCRIPT_CACHE_DIR)
+    except FileNotFoundError:
+        return 0
+    
+    removed = 0
+    with entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            if ((fingerprint and entry.name.startswith(f"{fingerprint}_")) or
+                    (cutoff is not None and entry.stat().st_mtime < cutoff)):
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError:
+                    pass
+    return removed
+
 
 class TranscriptionService:
     def __init__(self):
@@ -20,7 +73,24 @@ class TranscriptionService:
             except Exception as e:
                 st.warning(f"OpenAI initialization failed: {str(e)}")
         
-        self.audio_utils = AudioUtils()
+        self.audio_utils = get_audio_utils()
+        self.security = get_security_utils()
+        
+        # Model used by each provider, part of the transcript cache key
+        self.provider_models = {
+            'openai': 'whisper-1',
+            'huggingface': 'whisper-large-v3',
+            'local': os.getenv("LOCAL_WHISPER_MODEL", "base")
+        }
+        
+        # Requests per minute allowed to each provider, adapted on 429s. OpenAI
+        # limits each model separately, so transcription and chat get their own
+        openai_rpm = os.getenv("OPENAI_RPM", "60")
+        self.rate_limiters = {
+            'openai_audio': AdaptiveRateLimiter(float(os.getenv("OPENAI_AUDIO_RPM", openai_rpm))),
+            'openai_chat': AdaptiveRateLimiter(float(os.getenv("OPENAI_CHAT_RPM", openai_rpm))),
+            'assemblyai': AdaptiveRateLimiter(float(os.getenv("ASSEMBLYAI_RPM", "600")))
+        }
         
         # Available transcription providers
         self.providers = {
@@ -32,6 +102,14 @@ class TranscriptionService:
     def transcribe_audio(self, audio_file_path):
         """Transcribe audio file using available providers"""
         try:
+            # Reruns with the same upload are served from the cache
+            fingerprint = self._transcript_fingerprint(audio_file_path)
+            for provider in self._available_providers():
+                cached = self._load_cached_transcript(fingerprint, provider)
+                if cached:
+                    st.info("Using cached transcription...")
+                    return cached
+            
             # Convert audio to supported format if needed
             converted_path = self.audio_utils.convert_to_supported_format(audio_file_path)
             
@@ -41,6 +119,7 @@ class TranscriptionService:
                 result = self._transcribe_with_openai(converted_path)
                 if result:
                     self._cleanup_temp_file(converted_path, audio_file_path)
+                    self._store_cached_transcript(fingerprint, 'openai', result)
                     return result
             
             if self.huggingface_api_key:
@@ -48,6 +127,7 @@ class TranscriptionService:
                 result = self._transcribe_with_huggingface(converted_path)
                 if result:
                     self._cleanup_temp_file(converted_path, audio_file_path)
+                    self._store_cached_transcript(fingerprint, 'huggingface', result)
                     return result
             
             # Fall back to local model
@@ -55,6 +135,7 @@ class TranscriptionService:
             result = self._transcribe_with_local_model(converted_path)
             if result:
                 self._cleanup_temp_file(converted_path, audio_file_path)
+                self._store_cached_transcript(fingerprint, 'local', result)
                 return result
             
             st.error("All transcription methods failed. Please check your API keys or try a different audio file.")
@@ -64,8 +145,112 @@ class TranscriptionService:
             st.error(f"Transcription error: {str(e)}")
             return None
     
+    def transcribe_audio_with_status(self, audio_file_path, label="Transcribing audio..."):
+        """Run transcribe_audio on a worker thread while an st.status box shows chunk progress"""
+        progress = queue.Queue()
+        context = contextvars.copy_context()
+        context.run(_progress_queue.set, progress)
+        
+        # Lets the worker's own st.info/st.warning calls render in this session
+        script_ctx = get_script_run_ctx()
+        
+        def attach_script_ctx():
+            add_script_run_ctx(threading.current_thread(), script_ctx)
+        
+        with st.status(label) as status:
+            with ThreadPoolExecutor(max_workers=1, initializer=attach_script_ctx) as executor:
+                future = executor.submit(context.run, self.transcribe_audio, audio_file_path)
+                
+                while not future.done():
+                    try:
+                        done, total = progress.get(timeout=0.3)
+                    except queue.Empty:
+                        continue
+                    status.update(label=f"{label} chunk {done}/{total}")
+                
+                transcript = future.result()
+            
+            if transcript:
+                status.update(label="Transcription complete", state="complete")
+            else:
+                status.update(label="Transcription failed", state="error")
+        
+        return transcript
+    
+    def _available_providers(self):
+        """Providers transcribe_audio would try, in order of preference"""
+        providers = []
+        if self.openai_client:
+            providers.append('openai')
+        if self.huggingface_api_key:
+            providers.append('huggingface')
+        providers.append('local')
+        return providers
+    
+    def _transcript_fingerprint(self, audio_file_path):
+        """Content hash of the audio, or None when the cache is disabled"""
+        if os.getenv("TRANSCRIPT_CACHE_DISABLE") == "1":
+            return None
+        return self.audio_fingerprint(audio_file_path)
+    
+    def audio_fingerprint(self, audio_file_path):
+        """Content hash identifying a recording's cached transcripts (None on failure)
+        
+        Store it with the session so deleting the session can purge them.
+        """
+        try:
+            stat = os.stat(audio_file_path)
+        except OSError:
+            return None
+        return _audio_fingerprint(os.path.abspath(audio_file_path), stat.st_mtime_ns, stat.st_size)
+    
+    def _transcript_cache_path(self, fingerprint, provider):
+        """Cache file for a fingerprint/provider/model combination"""
+        model = self.provider_models[provider]
+        return os.path.join(_TRANSCRIPT_CACHE_DIR, f"{fingerprint}_{provider}_{model}.enc")
+    
+    def _load_cached_transcript(self, fingerprint, provider):
+        """Return a cached transcript, or None on a miss"""
+        if not fingerprint:
+            return None
+        
+        cache_path = self._transcript_cache_path(fingerprint, provider)
+        try:
+            with open(cache_path, 'rb') as f:
+                encrypted_data = f.read()
+            return json_utils.loads(self.security.decrypt_data(encrypted_data)).get('text')
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Unreadable entries are dropped and simply re-transcribed
+            os.remove(cache_path)
+            return None
+    
+    def _store_cached_transcript(self, fingerprint, provider, text):
+        """Persist a transcript; failures only cost a future cache miss"""
+        if not fingerprint:
+            return
+        
+        try:
+            os.makedirs(_TRANSCRIPT_CACHE_DIR, exist_ok=True)
+            cache_path = self._transcript_cache_path(fingerprint, provider)
+            
+            # Write then rename so concurrent readers never see a partial file
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(self.security.encrypt_data(json_utils.dumps({'text': text})))
+            os.replace(temp_path, cache_path)
+            
+            purge_cached_transcripts(max_age_days=float(
+                os.getenv("TRANSCRIPT_CACHE_MAX_AGE_DAYS", _TRANSCRIPT_CACHE_MAX_AGE_DAYS)
+            ))
+        except Exception as e:
+            st.warning(f"Could not cache transcription: {str(e)}")
+    
     def _cleanup_temp_file(self, converted_path, original_path):
         """Clean up temporary converted file"""
+        if self.audio_utils.is_cached_conversion(converted_path):
+            return
         if converted_path != original_path and os.path.exists(converted_path):
             os.remove(converted_path)
     
@@ -127,52 +312,65 @@ class TranscriptionService:
             return None
     
     def _transcribe_with_local_model(self, audio_file_path):
-        """Transcribe using local speech recognition (completely free)"""
+        """Transcribe offline with whisper.cpp (completely free)"""
+        try:
+            import whisper_parallel_cpu
+        except ImportError:
+            # Without the optional 'local' extra, use SpeechRecognition as before
+            # unless LOCAL_SR_FALLBACK=0 turns that off
+            if os.getenv("LOCAL_SR_FALLBACK", "1") != "0":
+                return self._transcribe_with_speech_recognition(audio_file_path)
+            st.warning("Local transcription requires the 'whisper-parallel-cpu' package")
+            return None
+        
+        try:
+            # whisper.cpp decodes mp3/mp4/m4a/wav itself, so no WAV export is needed
+            text = whisper_parallel_cpu.transcribe(
+                audio_file_path,
+                model=os.getenv("LOCAL_WHISPER_MODEL", "base")
+            )
+            return text.strip() if text else None
+            
+        except Exception as e:
+            st.warning(f"Local transcription failed: {str(e)}")
+            return None
+    
+    def _transcribe_with_speech_recognition(self, audio_file_path):
+        """Transcribe using the SpeechRecognition package (needs network access)"""
         try:
             import speech_recognition as sr
             
             # Initialize recognizer
             r = sr.Recognizer()
             
-            # Convert audio to WAV if needed
-            audio = AudioSegment.from_file(audio_file_path)
-            wav_path = audio_file_path.rsplit('.', 1)[0] + '_temp.wav'
-            audio.export(wav_path, format='wav')
+            # Convert audio to WAV only if it is not PCM WAV already
+            # (the stdlib wave module opens nothing else)
+            try:
+                with wave.open(audio_file_path, 'rb'):
+                    pass
+                wav_path = audio_file_path
+            except (wave.Error, EOFError):
+                audio = AudioSegment.from_file(audio_file_path)
+                wav_path = audio_file_path.rsplit('.', 1)[0] + '_temp.wav'
+                audio.export(wav_path, format='wav')
             
-            # Transcribe using Google's free API
-            with sr.AudioFile(wav_path) as source:
-                audio_data = r.record(source)
-                
-            # Try Google's free service first
             try:
-                text = r.recognize_google(audio_data)
-                os.remove(wav_path)
-                return text
+                with sr.AudioFile(wav_path) as source:
+                    audio_data = r.record(source)
+                return r.recognize_google(audio_data)
             except sr.UnknownValueError:
                 st.warning("Could not understand audio")
-                os.remove(wav_path)
                 return None
             except sr.RequestError as e:
                 st.warning(f"Google Speech Recognition service error: {e}")
-                # Try offline recognition as fallback
-                try:
-                    text = r.recognize_sphinx(audio_data)
-                    os.remove(wav_path)
-                    return text
-                except:
+                return None
+            finally:
+                if wav_path != audio_file_path:
                     os.remove(wav_path)
-                    return None
-                    
+                
         except ImportError:
-            st.warning("Local transcription requires 'SpeechRecognition' package. Installing...")
-            try:
-                import subprocess
-                subprocess.check_call(['pip', 'install', 'SpeechRecognition', 'pocketsphinx'])
-                st.info("Please restart the application to use local transcription")
-                return None
-            except:
-                st.error("Failed to install required packages for local transcription")
-                return None
+            st.warning("Fallback transcription requires the 'SpeechRecognition' package")
+            return None
         except Exception as e:
             st.warning(f"Local transcription failed: {str(e)}")
             return None
@@ -180,39 +378,10 @@ class TranscriptionService:
     def _transcribe_large_file_openai(self, audio_file_path):
         """Transcribe large audio file by splitting it into chunks (OpenAI)"""
         try:
-            # Load audio file
-            audio = AudioSegment.from_file(audio_file_path)
-            
-            # Split into 10-minute chunks
-            chunk_length = 10 * 60 * 1000  # 10 minutes in milliseconds
-            chunks = []
-            
-            for i in range(0, len(audio), chunk_length):
-                chunk = audio[i:i + chunk_length]
-                chunks.append(chunk)
+            chunk_buffers = self._export_openai_chunks(audio_file_path)
             
-            # Transcribe each chunk
-            transcriptions = []
-            
-            for i, chunk in enumerate(chunks):
-                st.info(f"Transcribing chunk {i+1}/{len(chunks)}")
-                
-                # Save chunk temporarily
-                chunk_path = f"temp_chunk_{i}.wav"
-                chunk.export(chunk_path, format="wav")
-                
-                # Transcribe chunk
-                with open(chunk_path, 'rb') as audio_file:
-                    response = self.openai_client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        response_format="json"
-                    )
-                
-                transcriptions.append(response.text)
-                
-                # Clean up chunk file
-                os.remove(chunk_path)
+            st.info(f"Transcribing {len(chunk_buffers)} chunks in parallel...")
+            transcriptions = asyncio.run(self._transcribe_chunks_openai_async(chunk_buffers))
             
             # Combine transcriptions
             full_transcription = " ".join(transcriptions)
@@ -223,6 +392,186 @@ class TranscriptionService:
             st.error(f"Large file transcription error: {str(e)}")
             return None
     
+    def _export_openai_chunks(self, audio_file_path):
+        """Split audio into in-memory WAV chunks small enough for Whisper"""
+        # Converted uploads are PCM WAV already, so their frames can be sliced directly
+        try:
+            with wave.open(audio_file_path, 'rb') as wav:
+                return self._pcm_wav_chunks(wav)
+        except (wave.Error, EOFError):
+            pass
+        
+        # Load audio file
+        audio = AudioSegment.from_file(audio_file_path)
+        
+        # Split into chunks of up to 10 minutes, cutting in pauses
+        chunks = self._silence_aware_chunks(audio)
+        
+        # Export every chunk to memory up front so the uploads can overlap
+        chunk_buffers = []
+        for chunk in chunks:
+            buffer = io.BytesIO()
+            chunk.export(buffer, format="wav")
+            buffer.seek(0)
+            chunk_buffers.append(buffer)
+        
+        return chunk_buffers
+    
+    def _silence_aware_chunks(self, audio, target_ms=10 * 60 * 1000, search_ms=30 * 1000,
+                              min_silence_len=700, silence_thresh=None):
+        """Split audio into chunks of at most target_ms, cutting inside pauses
+        
+        Only the last search_ms before each boundary is scanned for silence,
+        so detection cost stays small even for long recordings. When no pause
+        is found there the chunk is cut at the boundary as before.
+        """
+        if silence_thresh is None:
+            # Silent recordings have a dBFS of -inf; any fixed threshold will do
+            silence_thresh = audio.dBFS - 16 if audio.dBFS != float('-inf') else -50
+        
+        chunks = []
+        start = 0
+        while len(audio) - start > target_ms:
+            boundary = start + target_ms
+            window_start = max(start, boundary - search_ms)
+            pause = self._pause_midpoint(audio[window_start:boundary], min_silence_len, silence_thresh)
+            cut = window_start + pause if pause is not None else boundary
+            
+            chunks.append(audio[start:cut])
+            start = cut
+        
+        chunks.append(audio[start:])
+        return chunks
+    
+    def _pause_midpoint(self, window, min_silence_len, silence_thresh):
+        """Offset (ms) of the middle of the last pause in window, or None"""
+        silences = detect_silence(
+            window,
+            min_silence_len=min_silence_len,
+            silence_thresh=silence_thresh,
+            seek_step=10
+        )
+        if not silences:
+            return None
+        
+        # Cut in the middle of the pause closest to the boundary
+        silence_start, silence_end = silences[-1]
+        return (silence_start + silence_end) // 2
+    
+    def _pcm_wav_chunks(self, wav, target_ms=10 * 60 * 1000, search_ms=30 * 1000,
+                        min_silence_len=700):
+        """Slice an open PCM WAV into WAV buffers without decoding the whole file
+        
+        Frames are copied straight from the source; only the search window
+        before each boundary is loaded for silence detection, with a
+        threshold relative to that window's loudness.
+        """
+        params = wav.getparams()
+        frames_per_ms = params.framerate / 1000
+        target = int(target_ms * frames_per_ms)
+        search = int(search_ms * frames_per_ms)
+        
+        def read_frames(start, end):
+            wav.setpos(start)
+            return wav.readframes(end - start)
+        
+        def to_buffer(frames):
+            buffer = io.BytesIO()
+            with wave.open(buffer, 'wb') as out:
+                out.setparams(params)
+                out.writeframes(frames)
+            buffer.seek(0)
+            return buffer
+        
+        buffers = []
+        start = 0
+        while params.nframes - start > target:
+            boundary = start + target
+            window_start = max(start, boundary - search)
+            window = AudioSegment(
+                data=read_frames(window_start, boundary),
+                sample_width=params.sampwidth,
+                frame_rate=params.framerate,
+                channels=params.nchannels
+            )
+            
+            pause = None
+            if window.dBFS != float('-inf'):
+                pause = self._pause_midpoint(window, min_silence_len, window.dBFS - 16)
+            cut = window_start + int(pause * frames_per_ms) if pause is not None else boundary
+            
+            buffers.append(to_buffer(read_frames(start, cut)))
+            start = cut
+        
+        buffers.append(to_buffer(read_frames(start, params.nframes)))
+        return buffers
+    
+    async def _transcribe_chunks_openai_async(self, chunk_buffers, max_concurrency=8):
+        """Transcribe in-memory WAV chunks concurrently, returning texts in chunk order"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        client = self._async_openai_client()
+        
+        async def transcribe_one(buffer):
+            async with semaphore:
+                return await self._transcribe_chunk_openai(client, buffer)
+        
+        try:
+            # gather keeps results in the same order as the chunks
+            return await self._gather_with_progress(transcribe_one(buffer) for buffer in chunk_buffers)
+        finally:
+            await client.close()
+    
+    async def _gather_with_progress(self, coros):
+        """gather() that reports each finished task to the watching status box"""
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        
+        progress = _progress_queue.get()
+        if progress is not None:
+            done = 0
+            
+            def report(_task):
+                nonlocal done
+                done += 1
+                progress.put((done, len(tasks)))
+            
+            for task in tasks:
+                task.add_done_callback(report)
+        
+        return await asyncio.gather(*tasks)
+    
+    def _async_openai_client(self):
+        """AsyncOpenAI client on a connection pool sized for many concurrent chunks"""
+        from openai import AsyncOpenAI
+        
+        # The pool is configured on the transport; client-level limits are
+        # ignored once a custom transport is supplied
+        transport = httpx.AsyncHTTPTransport(
+            retries=2,
+            limits=httpx.Limits(max_connections=256, max_keepalive_connections=128)
+        )
+        # Every response, including the SDK's own retries, tunes the limiter
+        # of the endpoint that answered it
+        async def record_response(response):
+            endpoint = 'openai_audio' if '/audio/' in response.request.url.path else 'openai_chat'
+            self.rate_limiters[endpoint].record_response(response)
+        
+        http_client = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(600.0, connect=10.0),
+            event_hooks={'response': [record_response]}
+        )
+        return AsyncOpenAI(api_key=self.openai_api_key, http_client=http_client)
+    
+    async def _transcribe_chunk_openai(self, client, buffer):
+        """Transcribe one in-memory WAV chunk with an AsyncOpenAI client"""
+        async with self.rate_limiters['openai_audio']:
+            response = await client.audio.transcriptions.create(
+                model="whisper-1",
+                file=("chunk.wav", buffer, "audio/wav"),
+                response_format="json"
+            )
+        return response.text
+    
     def transcribe_with_speaker_diarization(self, audio_file_path):
         """Transcribe with speaker identification (using AssemblyAI as alternative)"""
         try:
@@ -231,69 +580,108 @@ class TranscriptionService:
                 st.warning("AssemblyAI API key not configured, using standard transcription")
                 return self.transcribe_audio(audio_file_path)
             
-            # Upload file to AssemblyAI
-            headers = {
-                "authorization": assembly_api_key,
-                "content-type": "application/json"
-            }
-            
-            # Upload audio file
-            with open(audio_file_path, 'rb') as f:
-                response = requests.post(
-                    "https://api.assemblyai.com/v2/upload",
-                    headers={"authorization": assembly_api_key},
-                    data=f
-                )
-            
-            if response.status_code != 200:
-                st.error("Failed to upload audio to AssemblyAI")
-                return self.transcribe_audio(audio_file_path)
-            
-            audio_url = response.json()["upload_url"]
-            
-            # Request transcription with speaker diarization
-            transcript_request = {
-                "audio_url": audio_url,
-                "speaker_labels": True,
-                "auto_chapters": True,
-                "sentiment_analysis": True
-            }
-            
-            response = requests.post(
-                "https://api.assemblyai.com/v2/transcript",
-                json=transcript_request,
-                headers=headers
+            transcript = asyncio.run(
+                self._transcribe_with_assemblyai_async(audio_file_path, assembly_api_key)
             )
-            
-            if response.status_code != 200:
-                st.error("Failed to request transcription")
+            if transcript is None:
                 return self.transcribe_audio(audio_file_path)
             
-            transcript_id = response.json()["id"]
-            
-            # Poll for completion
-            while True:
-                response = requests.get(
-                    f"https://api.assemblyai.com/v2/transcript/{transcript_id}",
-                    headers=headers
-                )
-                
-                transcript = response.json()
-                
-                if transcript["status"] == "completed":
-                    return self._format_diarized_transcript(transcript)
-                elif transcript["status"] == "error":
-                    st.error(f"Transcription failed: {transcript['error']}")
-                    return self.transcribe_audio(audio_file_path)
-                else:
-                    st.info("Transcription in progress...")
-                    import time
-                    time.sleep(5)
+            return self._format_diarized_transcript(transcript)
                     
         except Exception as e:
             st.error(f"Diarization error: {str(e)}")
             return self.transcribe_audio(audio_file_path)
     
+    async def _transcribe_with_assemblyai_async(self, audio_file_path, assembly_api_key):
+        """Run AssemblyAI diarization as a single job (None on failure)
+        
+        The whole recording goes up as one job: speaker labels are only
+        consistent within a job, so splitting would mislabel speakers
+        across chunk boundaries.
+        """
+        headers = {
+            "authorization": assembly_api_key,
+            "content-type": "application/json"
+        }
+        
+        st.info("Transcription in progress...")
+        
+        async with httpx.AsyncClient(
+            base_url="https://api.assemblyai.com/v2",
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(60.0)
+        ) as client:
+            # httpx sends the generator with chunked transfer encoding, so
+            # only 1 MB of the recording is held at a time
+            return await self._assemblyai_job(
+                client, headers, lambda: self._iter_file_chunks(audio_file_path)
+            )
+    
+    async def _assemblyai_job(self, client, headers, content_factory):
+        """Upload audio, request a diarized transcript and poll it to completion"""
+        # A repeated upload only leaves an unused URL behind, so it is safe to
+        # retry on gateway errors; the transcript request below is not
+        response = await request_with_backoff(
+            client, "POST", "/upload",
+            headers={"authorization": headers["authorization"]},
+            content_factory=content_factory,
+            limiter=self.rate_limiters['assemblyai'],
+            idempotent=True
+        )
+        
+        if response.status_code != 200:
+            st.error("Failed to upload audio to AssemblyAI")
+            return None
+        
+        audio_url = response.json()["upload_url"]
+        
+        # Request transcription with speaker diarization
+        transcript_request = {
+            "audio_url": audio_url,
+            "speaker_labels": True,
+            "auto_chapters": True,
+            "sentiment_analysis": True
+        }
+        
+        response = await request_with_backoff(
+            client, "POST", "/transcript",
+            json=transcript_request,
+            headers=headers,
+            limiter=self.rate_limiters['assemblyai']
+        )
+        
+        if response.status_code != 200:
+            st.error("Failed to request transcription")
+            return None
+        
+        transcript_id = response.json()["id"]
+        
+        # Poll for completion, backing off while the job is still running
+        delay = 3.0
+        while True:
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 30)
+            
+            response = await request_with_backoff(
+                client, "GET", f"/transcript/{transcript_id}",
+                headers=headers,
+                limiter=self.rate_limiters['assemblyai']
+            )
+            
+            transcript = response.json()
+            
+            if transcript["status"] == "completed":
+                return transcript
+            elif transcript["status"] == "error":
+                st.error(f"Transcription failed: {transcript['error']}")
+                return None
+    
+    async def _iter_file_chunks(self, file_path, chunk_size=1024 * 1024):
+        """Yield a file in fixed-size chunks for streamed uploads"""
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+    
     def _format_diarized_transcript(self, transcript_data):
         """Format diarized transcript with speaker labels"""
         try:
@@ -319,18 +707,9 @@ class TranscriptionService:
             # do not change this unless explicitly requested by the user
             response = self.openai_client.chat.completions.create(
                 model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a professional therapy session summarizer. "
-                                 "Create a concise summary of the key topics, themes, and "
-                                 "important moments from this therapy session transcript."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Please summarize this therapy session transcript:\n\n{transcript}"
-                    }
-                ],
+                messages=self._summary_messages(
+                    f"Please summarize this therapy session transcript:\n\n{transcript}"
+                ),
                 max_tokens=500
             )
             
@@ -339,3 +718,106 @@ class TranscriptionService:
         except Exception as e:
             st.error(f"Summary generation error: {str(e)}")
             return None
+    
+    def _summary_messages(self, request):
+        """Chat messages asking gpt-4o for a therapy session summary"""
+        return [
+            {
+                "role": "system",
+                "content": "You are a professional therapy session summarizer. "
+                         "Create a concise summary of the key topics, themes, and "
+                         "important moments from this therapy session transcript."
+            },
+            {
+                "role": "user",
+                "content": request
+            }
+        ]
+    
+    def transcribe_and_summarize(self, audio_file_path):
+        """Transcribe and summarize audio, returning (transcript, summary)
+        
+        For recordings too large for a single Whisper request each chunk is
+        summarized as soon as it is transcribed, and the partial summaries
+        are merged with one final call once every chunk is done.
+        """
+        try:
+            fingerprint = self._transcript_fingerprint(audio_file_path)
+            cached = self._load_cached_transcript(fingerprint, 'openai') if self.openai_client else None
+            
+            if self.openai_client and not cached:
+                converted_path = self.audio_utils.convert_to_supported_format(audio_file_path)
+                if os.path.getsize(converted_path) > 25 * 1024 * 1024:
+                    chunk_buffers = self._export_openai_chunks(converted_path)
+                    self._cleanup_temp_file(converted_path, audio_file_path)
+                    
+                    st.info(f"Transcribing and summarizing {len(chunk_buffers)} chunks in parallel...")
+                    transcript, summary = asyncio.run(
+                        self._transcribe_and_summarize_chunks_async(chunk_buffers)
+                    )
+                    self._store_cached_transcript(fingerprint, 'openai', transcript)
+                    return transcript, summary
+                self._cleanup_temp_file(converted_path, audio_file_path)
+            
+            transcript = cached or self.transcribe_audio(audio_file_path)
+            if not transcript:
+                return None, None
+            
+            summary = self.get_transcript_summary(transcript) if self.openai_client else None
+            return transcript, summary
+            
+        except Exception as e:
+            st.error(f"Transcription error: {str(e)}")
+            return None, None
+    
+    async def _transcribe_and_summarize_chunks_async(self, chunk_buffers, max_concurrency=8):
+        """Transcribe chunks concurrently, summarizing each one as soon as its text arrives"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+        client = self._async_openai_client()
+        
+        async def summarize(request):
+            async with self.rate_limiters['openai_chat']:
+                response = await client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=self._summary_messages(request),
+                    max_tokens=500
+                )
+            return response.choices[0].message.content
+        
+        async def process_one(buffer):
+            async with semaphore:
+                text = await self._transcribe_chunk_openai(client, buffer)
+            
+            # Map step: runs while later chunks are still being transcribed
+            async with semaphore:
+                try:
+                    partial = await summarize(
+                        f"Please summarize this part of a therapy session transcript:\n\n{text}"
+                    )
+                except Exception as e:
+                    st.warning(f"Partial summary failed: {str(e)}")
+                    partial = None
+            return text, partial
+        
+        try:
+            results = await self._gather_with_progress(process_one(buffer) for buffer in chunk_buffers)
+            transcript = " ".join(text for text, _ in results)
+            
+            # Reduce step: merge the partial summaries in session order
+            partials = [partial for _, partial in results if partial]
+            if not partials:
+                return transcript, None
+            
+            try:
+                summary = await summarize(
+                    "These are summaries of consecutive parts of one therapy session. "
+                    "Combine them into a single summary of the whole session:\n\n"
+                    + "\n\n".join(f"Part {i}: {partial}" for i, partial in enumerate(partials, 1))
+                )
+            except Exception as e:
+                st.error(f"Summary generation error: {str(e)}")
+                summary = None
+            
+            return transcript, summary
+        finally:
+            await client.close()
@@ -1,8 +1,62 @@
 import os
-import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
 from datetime import datetime
+from functools import lru_cache
+from string import Template
+from utils import json_utils
+
+# Built once at import; filled in by _render_system_message
+_SYSTEM_MESSAGE_TEMPLATE = Template("""
+        You are a compassionate therapeutic assistant helping a client reflect on their therapy session.
+        
+        Session Context:
+        - Session Date: $session_date
+        - Domain Scores: $domain_scores
+        - Key Insights: $key_insights
+        - Recommendations: $recommendations
+        - Session Themes: $session_themes
+        - Progress Indicators: $progress_indicators
+        
+        Guidelines:
+        1. Be warm, empathetic, and supportive
+        2. Use therapeutic language informed by multiple approaches (Rogers, Freud, Beck, etc.)
+        3. Focus on the client's strengths and progress
+        4. Encourage self-reflection and insight
+        5. Avoid giving direct advice; instead, guide the client to their own insights
+        6. Keep responses concise but meaningful
+        7. If asked about specific scores, explain them in accessible terms
+        8. Maintain professional boundaries while being caring
+        
+        Common questions you might receive:
+        - "Am I making progress in therapy?"
+        - "What themes came up in today's session?"
+        - "How am I doing with my emotional safety?"
+        - "What should I focus on next?"
+        
+        Always respond with empathy and refer to the specific session data when relevant.
+        """)
+
+
+@lru_cache(maxsize=32)
+def _render_system_message(context_json):
+    """Fill the system message template from a JSON-encoded session context"""
+    context = json_utils.loads(context_json)
+    
+    def pretty(key, default):
+        return json_utils.dumps(context.get(key, default), indent=True).decode('utf-8')
+    
+    return _SYSTEM_MESSAGE_TEMPLATE.substitute(
+        session_date=context.get('session_date', 'Unknown'),
+        domain_scores=pretty('domain_scores', {}),
+        key_insights=pretty('key_insights', []),
+        recommendations=pretty('recommendations', []),
+        session_themes=pretty('session_themes', []),
+        progress_indicators=pretty('progress_indicators', [])
+    )
+
 
 class VAPIService:
     def __init__(self):
@@ -13,6 +67,19 @@ class VAPIService:
             "Content-Type": "application/json"
         }
         
+        # Pooled session so chained calls (assistant, then call) reuse the TLS connection
+        self._http = requests.Session()
+        self._http.headers.update(self.headers)
+        self._http.mount('https://', HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504)
+            )
+        ))
+        
     def start_voice_session(self, session_data):
         """Start a voice interaction session with VAPI"""
         try:
@@ -42,14 +109,13 @@ class VAPIService:
             }
             
             # Create assistant
-            response = requests.post(
+            response = self._http.post(
                 f"{self.base_url}/assistants",
-                headers=self.headers,
-                json=assistant_config
+                data=json_utils.dumps(assistant_config)
             )
             
             if response.status_code == 201:
-                assistant_id = response.json()["id"]
+                assistant_id = json_utils.loads(response.content)["id"]
                 
                 # Start call
                 call_config = {
@@ -59,14 +125,13 @@ class VAPIService:
                     }
                 }
                 
-                call_response = requests.post(
+                call_response = self._http.post(
                     f"{self.base_url}/calls",
-                    headers=self.headers,
-                    json=call_config
+                    data=json_utils.dumps(call_config)
                 )
                 
                 if call_response.status_code == 201:
-                    call_id = call_response.json()["id"]
+                    call_id = json_utils.loads(call_response.content)["id"]
                     st.success(f"Voice session started! Call ID: {call_id}")
                     return True
                 else:
@@ -104,48 +169,18 @@ class VAPIService:
     
     def _get_system_message(self, context):
         """Generate system message for the AI assistant"""
-        system_message = f"""
-        You are a compassionate therapeutic assistant helping a client reflect on their therapy session.
-        
-        Session Context:
-        - Session Date: {context.get('session_date', 'Unknown')}
-        - Domain Scores: {json.dumps(context.get('domain_scores', {}), indent=2)}
-        - Key Insights: {json.dumps(context.get('key_insights', []), indent=2)}
-        - Recommendations: {json.dumps(context.get('recommendations', []), indent=2)}
-        - Session Themes: {json.dumps(context.get('session_themes', []), indent=2)}
-        - Progress Indicators: {json.dumps(context.get('progress_indicators', []), indent=2)}
-        
-        Guidelines:
-        1. Be warm, empathetic, and supportive
-        2. Use therapeutic language informed by multiple approaches (Rogers, Freud, Beck, etc.)
-        3. Focus on the client's strengths and progress
-        4. Encourage self-reflection and insight
-        5. Avoid giving direct advice; instead, guide the client to their own insights
-        6. Keep responses concise but meaningful
-        7. If asked about specific scores, explain them in accessible terms
-        8. Maintain professional boundaries while being caring
-        
-        Common questions you might receive:
-        - "Am I making progress in therapy?"
-        - "What themes came up in today's session?"
-        - "How am I doing with my emotional safety?"
-        - "What should I focus on next?"
-        
-        Always respond with empathy and refer to the specific session data when relevant.
-        """
-        
-        return system_message
+        # The same session is often rendered several times per run; key on its JSON
+        return _render_system_message(json_utils.dumps(context))
     
     def get_call_transcript(self, call_id):
         """Get transcript of a voice interaction"""
         try:
-            response = requests.get(
-                f"{self.base_url}/calls/{call_id}",
-                headers=self.headers
+            response = self._http.get(
+                f"{self.base_url}/calls/{call_id}"
             )
             
             if response.status_code == 200:
-                call_data = response.json()
+                call_data = json_utils.loads(response.content)
                 return call_data.get("transcript", "")
             else:
                 st.error(f"Failed to get call transcript: {response.status_code}")
@@ -185,14 +220,13 @@ class VAPIService:
                 }
             }
             
-            response = requests.post(
+            response = self._http.post(
                 f"{self.base_url}/phone-numbers",
-                headers=self.headers,
-                json=phone_config
+                data=json_utils.dumps(phone_config)
             )
             
             if response.status_code == 201:
-                phone_data = response.json()
+                phone_data = json_utils.loads(response.content)
                 return phone_data.get("number")
             else:
                 st.error(f"Failed to create phone number: {response.status_code}")
@@ -205,13 +239,12 @@ class VAPIService:
     def get_voice_analytics(self, call_id):
         """Get analytics from a voice interaction"""
         try:
-            response = requests.get(
-                f"{self.base_url}/calls/{call_id}/analytics",
-                headers=self.headers
+            response = self._http.get(
+                f"{self.base_url}/calls/{call_id}/analytics"
             )
             
             if response.status_code == 200:
-                return response.json()
+                return json_utils.loads(response.content)
             else:
                 return {}
                 
@@ -222,9 +255,8 @@ class VAPIService:
     def end_voice_session(self, call_id):
         """End an active voice session"""
         try:
-            response = requests.post(
-                f"{self.base_url}/calls/{call_id}/end",
-                headers=self.headers
+            response = self._http.post(
+                f"{self.base_url}/calls/{call_id}/end"
             )
             
             return response.status_code == 200
@@ -1,45 +1,85 @@
+import os
+import time
+import asyncio
+import httpx
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timedelta
 import streamlit as st
 from services.auth_service import AuthService
+from utils import json_utils
+from utils.http_utils import request_with_backoff
 
 class ZoomService:
     def __init__(self):
         self.auth_service = AuthService()
         self.base_url = "https://api.zoom.us/v2"
         
+        # Pooled session so consecutive API calls reuse the TLS connection
+        self._http = requests.Session()
+        self._http.mount('https://', HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504)
+            )
+        ))
+        
+        # Cached OAuth token and the headers built from it
+        self._token = None
+        self._token_expiry = 0.0
+        self._headers = None
+        
+    def _auth_headers(self):
+        """Return Zoom request headers, refreshing the cached token when near expiry"""
+        if self._headers is None or time.monotonic() >= self._token_expiry - 30:
+            token, expires_at = self.auth_service.get_token_with_expiry('zoom')
+            if not token:
+                self._token = None
+                self._headers = None
+                return None
+            
+            ttl = (expires_at - datetime.now()).total_seconds()
+            self._token = token
+            self._token_expiry = time.monotonic() + ttl
+            self._headers = {
+                'Authorization': f'Bearer {token}',
+                'Content-Type': 'application/json'
+            }
+        
+        return self._headers
+    
     def get_recent_recordings(self, days_back=7):
         """Get recent cloud recordings from Zoom"""
         try:
-            token = self.auth_service.get_token('zoom')
-            if not token:
+            headers = self._auth_headers()
+            if not headers:
                 st.error("Not authenticated with Zoom")
                 return []
-                
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
             
-            # Get recordings from the last N days
-            from_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d')
-            to_date = datetime.now().strftime('%Y-%m-%d')
+            # Zoom pages with opaque next_page_token values, so pages of one
+            # query must be read in order; instead the date range is split
+            # into weekly windows that are fetched side by side
+            today = datetime.now().date()
+            windows = []
+            window_end = today
+            while window_end >= today - timedelta(days=days_back):
+                window_start = max(window_end - timedelta(days=6), today - timedelta(days=days_back))
+                windows.append((window_start.isoformat(), window_end.isoformat()))
+                window_end = window_start - timedelta(days=1)
             
-            url = f"{self.base_url}/users/me/recordings"
-            params = {
-                'from': from_date,
-                'to': to_date,
-                'page_size': 100
-            }
-            
-            response = requests.get(url, headers=headers, params=params)
+            results = asyncio.run(self._fetch_meetings_async(headers, windows))
             
-            if response.status_code == 200:
-                data = response.json()
-                recordings = []
+            recordings = []
+            failures = []
+            for (from_date, to_date), (meetings, status_code) in zip(windows, results):
+                if status_code:
+                    failures.append((from_date, to_date, status_code))
                 
-                for meeting in data.get('meetings', []):
+                for meeting in meetings:
                     for recording in meeting.get('recording_files', []):
                         if recording.get('file_type') == 'M4A':  # Audio only
                             recordings.append({
@@ -51,73 +91,131 @@ class ZoomService:
                                 'file_size': recording.get('file_size'),
                                 'platform': 'zoom'
                             })
-                
-                return recordings
-            else:
-                st.error(f"Failed to fetch Zoom recordings: {response.status_code}")
-                return []
+            
+            # One message for the whole range, not one per weekly window
+            if failures:
+                statuses = ", ".join(sorted({str(status) for _, _, status in failures}))
+                st.error(
+                    f"Failed to fetch Zoom recordings for {len(failures)} of {len(windows)} "
+                    f"week(s) between {failures[-1][0]} and {failures[0][1]} (status {statuses})"
+                )
+            
+            return recordings
                 
         except Exception as e:
             st.error(f"Zoom service error: {str(e)}")
             return []
     
+    async def _fetch_meetings_async(self, headers, windows, max_concurrency=4):
+        """Fetch every page of recordings for each (from, to) window, newest window first
+        
+        Returns (meetings, failed status code or None) per window. At most
+        four requests are in flight to stay under Zoom's per-second limit.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async with httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=httpx.Timeout(30.0)
+        ) as client:
+            async def fetch_window(from_date, to_date):
+                meetings = []
+                params = {
+                    'from': from_date,
+                    'to': to_date,
+                    'page_size': 300
+                }
+                
+                while True:
+                    async with semaphore:
+                        response = await request_with_backoff(
+                            client, 'GET', '/users/me/recordings', params=params
+                        )
+                    if response.status_code != 200:
+                        return meetings, response.status_code
+                    
+                    data = json_utils.loads(response.content)
+                    meetings.extend(data.get('meetings', []))
+                    
+                    next_page_token = data.get('next_page_token')
+                    if not next_page_token:
+                        return meetings, None
+                    params = {**params, 'next_page_token': next_page_token}
+            
+            return await asyncio.gather(*(fetch_window(f, t) for f, t in windows))
+    
     def download_recording(self, recording_info):
         """Download a specific recording"""
+        return self.download_recordings([recording_info])[0]
+    
+    def download_recordings(self, recording_infos):
+        """Download several recordings concurrently, preserving order"""
         try:
-            token = self.auth_service.get_token('zoom')
-            if not token:
-                return None
-                
-            headers = {
-                'Authorization': f'Bearer {token}'
-            }
+            headers = self._auth_headers()
+            if not headers:
+                return [None] * len(recording_infos)
             
-            response = requests.get(
-                recording_info['download_url'], 
-                headers=headers, 
-                stream=True
-            )
+            results = asyncio.run(self._download_recordings_async(recording_infos, headers))
             
-            if response.status_code == 200:
+            errors = [error for _, error in results if error]
+            if errors:
+                st.error("; ".join(errors))
+            
+            return [filepath for filepath, _ in results]
+                
+        except Exception as e:
+            st.error(f"Download error: {str(e)}")
+            return [None] * len(recording_infos)
+    
+    async def _download_recordings_async(self, recording_infos, headers):
+        """Stream all recordings at once over a shared client (8 connections max)"""
+        # Create directory if it doesn't exist
+        os.makedirs('recordings', exist_ok=True)
+        
+        async with httpx.AsyncClient(
+            headers={'Authorization': headers['Authorization']},
+            limits=httpx.Limits(max_connections=8),
+            timeout=httpx.Timeout(60.0),
+            follow_redirects=True
+        ) as client:
+            return await asyncio.gather(
+                *(self._download_one(client, recording_info) for recording_info in recording_infos)
+            )
+    
+    async def _download_one(self, client, recording_info):
+        """Download one recording, returning (filepath, error message)"""
+        try:
+            async with client.stream('GET', recording_info['download_url']) as response:
+                if response.status_code != 200:
+                    return None, f"Failed to download recording: {response.status_code}"
+                
                 # Generate filename
                 filename = f"zoom_recording_{recording_info['id']}.m4a"
                 filepath = f"recordings/{filename}"
                 
-                # Create directory if it doesn't exist
-                import os
-                os.makedirs('recordings', exist_ok=True)
-                
                 # Save file
                 with open(filepath, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
+                    async for chunk in response.aiter_bytes(chunk_size=1 << 20):
                         f.write(chunk)
                 
-                return filepath
-            else:
-                st.error(f"Failed to download recording: {response.status_code}")
-                return None
+                return filepath, None
                 
         except Exception as e:
-            st.error(f"Download error: {str(e)}")
-            return None
+            return None, f"Download error: {str(e)}"
     
     def get_meeting_details(self, meeting_id):
         """Get detailed information about a specific meeting"""
         try:
-            token = self.auth_service.get_token('zoom')
-            if not token:
+            headers = self._auth_headers()
+            if not headers:
                 return None
-                
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
             
             url = f"{self.base_url}/meetings/{meeting_id}"
-            response = requests.get(url, headers=headers)
+            response = self._http.get(url, headers=headers)
             
             if response.status_code == 200:
-                return response.json()
+                return json_utils.loads(response.content)
             else:
                 return None
                 
@@ -128,14 +226,9 @@ class ZoomService:
     def schedule_webhook(self, webhook_url):
         """Schedule webhook for automatic recording processing"""
         try:
-            token = self.auth_service.get_token('zoom')
-            if not token:
+            headers = self._auth_headers()
+            if not headers:
                 return False
-                
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
             
             webhook_data = {
                 'url': webhook_url,
@@ -145,7 +238,7 @@ class ZoomService:
             }
             
             url = f"{self.base_url}/webhooks"
-            response = requests.post(url, headers=headers, json=webhook_data)
+            response = self._http.post(url, headers=headers, data=json_utils.dumps(webhook_data))
             
             return response.status_code == 201
             
@@ -0,0 +1,42 @@
+"""Tests for overlapping segmentation of decoded audio"""
+
+import numpy as np
+import pytest
+
+from utils.audio_utils import AudioUtils, DecodedAudio, chunk_ranges
+
+
+def _decoded(seconds, sample_rate=16000, channels=2):
+    frames = int(seconds * sample_rate)
+    samples = np.arange(frames * channels, dtype=np.int64).astype(np.int16).reshape(frames, channels)
+    return DecodedAudio(samples, sample_rate, channels)
+
+
+def test_chunk_ranges_overlap():
+    assert chunk_ranges(59 * 100, 100) == [(0, 3000), (2900, 5900)]
+    # A trailing window inside the previous overlap is not emitted
+    assert chunk_ranges(30 * 100, 100) == [(0, 3000)]
+    assert chunk_ranges(0, 100) == []
+    with pytest.raises(ValueError):
+        chunk_ranges(1000, 100, chunk_s=1, overlap_s=1)
+
+
+@pytest.mark.parametrize("segment_duration", [30, 2.5])
+def test_get_audio_batch(segment_duration):
+    decoded = _decoded(7.3)
+
+    batch, ranges = AudioUtils().get_audio_batch(None, segment_duration, decoded=decoded)
+
+    window = int(segment_duration * decoded.sample_rate)
+    assert batch.shape == (len(ranges), window, decoded.channels)
+    for row, (start, end) in zip(batch, ranges):
+        np.testing.assert_array_equal(row[:end - start], decoded.samples[start:end])
+        assert not row[end - start:].any()
+
+
+def test_get_audio_segments_overlap():
+    decoded = _decoded(65)
+
+    segments = AudioUtils().get_audio_segments(None, decoded=decoded)
+
+    assert [len(segment) for segment in segments] == [30000, 30000, 7000]
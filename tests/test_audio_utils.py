@@ -0,0 +1,93 @@
+"""Smoke tests for the ffmpeg-backed AudioUtils paths (skipped without ffmpeg)"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from utils.audio_utils import AudioUtils
+
+pytestmark = pytest.mark.skipif(
+    not (shutil.which("ffmpeg") and shutil.which("ffprobe")),
+    reason="ffmpeg and ffprobe are required"
+)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # The conversion cache lives under ./temp, so keep it inside tmp_path
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def stereo_mp3(workdir):
+    """20 s of 44.1 kHz stereo tone with a 3 s pause in the middle"""
+    path = str(workdir / "session.mp3")
+    subprocess.run([
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", "sine=frequency=300:sample_rate=44100:duration=20",
+        "-af", "volume=enable='between(t,8,11)':volume=0",
+        "-ac", "2", "-c:a", "libmp3lame", "-b:a", "128k", path
+    ], check=True)
+    return path
+
+
+def test_convert_to_supported_format(stereo_mp3):
+    audio_utils = AudioUtils()
+
+    converted = audio_utils.convert_to_supported_format(stereo_mp3)
+
+    assert converted != stereo_mp3
+    assert audio_utils.is_cached_conversion(converted)
+    info = audio_utils.get_audio_info(converted)
+    assert info['sample_rate'] == 16000
+    assert info['channels'] == 1
+    assert info['duration'] == pytest.approx(20, abs=0.1)
+
+    # A second call is served from the cache
+    assert audio_utils.convert_to_supported_format(stereo_mp3) == converted
+
+
+def test_convert_without_cache(stereo_mp3, monkeypatch):
+    monkeypatch.setenv("AUDIO_CACHE_DISABLE", "1")
+    audio_utils = AudioUtils()
+
+    converted = audio_utils.convert_to_supported_format(stereo_mp3)
+
+    assert converted == stereo_mp3.rsplit('.', 1)[0] + '_converted.wav'
+    assert not audio_utils.is_cached_conversion(converted)
+    assert audio_utils.get_audio_info(converted)['sample_rate'] == 16000
+
+
+def test_split_audio_by_size(stereo_mp3):
+    audio_utils = AudioUtils()
+    max_size_mb = os.path.getsize(stereo_mp3) / (1024 * 1024) / 2.5
+
+    chunks = audio_utils.split_audio_by_size(stereo_mp3, max_size_mb=max_size_mb)
+
+    assert len(chunks) >= 3
+    for chunk in chunks:
+        assert os.path.getsize(chunk) <= max_size_mb * 1024 * 1024
+    total = sum(audio_utils.get_audio_info(chunk)['duration'] for chunk in chunks)
+    assert total == pytest.approx(20, abs=0.5)
+
+
+def test_validate_and_filters(stereo_mp3):
+    audio_utils = AudioUtils()
+
+    assert audio_utils.validate_audio_file(stereo_mp3)
+
+    enhanced = audio_utils.enhance_audio_quality(stereo_mp3)
+    assert enhanced.endswith('_enhanced.wav')
+
+    thumbnail = audio_utils.create_audio_thumbnail(stereo_mp3, duration=5)
+    assert audio_utils.get_audio_info(thumbnail)['duration'] == pytest.approx(5, abs=0.1)
+
+    processed = audio_utils.pipeline(stereo_mp3)
+    info = audio_utils.get_audio_info(processed)
+    assert info['sample_rate'] == 16000
+    assert info['channels'] == 1
+    # The 3 s pause shrinks to about 200 ms
+    assert info['duration'] < 18
@@ -1,9 +1,103 @@
 import os
+import re
+import json
+import mmap
+import wave
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
 import tempfile
+import numpy as np
 import streamlit as st
-from pydub import AudioSegment
-from pydub.utils import which
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from blake3 import blake3
+except ImportError:
+    blake3 = None
+
+# Converted copies of uploads, reused across Streamlit reruns; kept under
+# temp/ so SessionManager.cleanup_temp_files clears them with the uploads
+_AUDIO_CACHE_DIR = os.path.join('temp', 'audio_cache')
+
+# Q of the two biquad sections of a 4th-order Butterworth filter, as
+# scipy.signal.butter(4, ..., output='sos') would design it
+_BUTTERWORTH4_Q = (0.5412, 1.3066)
+
+# Speech band (80 Hz - 8 kHz) and gentle compression used by enhance_audio_quality
+_BANDPASS_FILTERS = (
+    *(f"highpass=f=80:width_type=q:width={q}" for q in _BUTTERWORTH4_Q),
+    *(f"lowpass=f=8000:width_type=q:width={q}" for q in _BUTTERWORTH4_Q),
+)
+_COMPRESSOR_FILTER = "acompressor=threshold=-20dB:ratio=4:attack=5:release=50"
+
+# 10 ms frames squared per block in remove_silence (~10 s of audio)
+_POWER_BLOCK_FRAMES = 1000
+
+_FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
+_FFPROBE = shutil.which("ffprobe") or "ffprobe"
+
+
+def _run_ffmpeg(args: list, input: bytes = None):
+    """Run one ffmpeg command, raising with its stderr on failure"""
+    result = subprocess.run(
+        [_FFMPEG, *(("-nostdin",) if input is None else ()),
+         "-hide_banner", "-loglevel", "error", "-y", *args],
+        input=input, capture_output=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip() or "ffmpeg failed")
+
+
+def _write_wav(path: str, samples: np.ndarray, sample_rate: int, channels: int):
+    """Write int16 samples as a PCM WAV file"""
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+
+
+@dataclass
+class DecodedAudio:
+    """16-bit PCM from AudioUtils.decode, shared between AudioUtils methods"""
+    samples: np.ndarray  # int16, shape (frames, channels), read-only
+    sample_rate: int
+    channels: int
+    
+    def segment(self, start: int = 0, end: int = None):
+        """AudioSegment for frames [start, end)"""
+        from pydub import AudioSegment
+        return AudioSegment(
+            self.samples[start:end].tobytes(),
+            sample_width=2,
+            frame_rate=self.sample_rate,
+            channels=self.channels
+        )
+    
+    def ffmpeg_input(self) -> list:
+        """ffmpeg arguments reading these samples as raw PCM from stdin"""
+        return ["-f", "s16le", "-ar", str(self.sample_rate), "-ac", str(self.channels), "-i", "pipe:0"]
+
+
+def chunk_ranges(n_frames: int, sample_rate: int, chunk_s: float = 30, overlap_s: float = 1) -> list:
+    """(start, end) frames of chunk_s windows that overlap by overlap_s
+    
+    The last window is shorter when the audio does not divide evenly; no
+    window lies entirely inside the previous one's overlap.
+    """
+    window = int(chunk_s * sample_rate)
+    overlap = int(overlap_s * sample_rate)
+    if overlap >= window:
+        raise ValueError("Overlap must be shorter than the chunk")
+    if n_frames <= 0:
+        return []
+    
+    return [(start, min(start + window, n_frames))
+            for start in range(0, max(n_frames - overlap, 1), window - overlap)]
+
 
 class AudioUtils:
     """Audio processing utilities for therapy session recordings"""
@@ -21,28 +115,38 @@ class AudioUtils:
             if not os.path.exists(input_path):
                 raise FileNotFoundError(f"Audio file not found: {input_path}")
             
+            # Reruns with the same upload reuse the earlier conversion
+            cache_path = self._conversion_cache_path(input_path)
+            if cache_path and os.path.exists(cache_path):
+                os.utime(cache_path)  # Mark as recently used for eviction
+                return cache_path
+            
             # Get file extension
             file_extension = input_path.lower().split('.')[-1]
             
             # If already in optimal format, check if conversion is needed
             if file_extension == self.target_format:
-                audio = AudioSegment.from_file(input_path)
-                if (audio.frame_rate == self.target_sample_rate and 
-                    audio.channels == self.target_channels):
+                stream = self._audio_stream(self._probe(input_path))
+                if (int(stream.get('sample_rate', 0)) == self.target_sample_rate and
+                    stream.get('channels') == self.target_channels):
                     return input_path
             
-            # Load audio file
-            audio = AudioSegment.from_file(input_path)
-            
-            # Convert to optimal settings
-            audio = audio.set_frame_rate(self.target_sample_rate)
-            audio = audio.set_channels(self.target_channels)
-            
             # Generate output path
-            output_path = input_path.rsplit('.', 1)[0] + '_converted.wav'
-            
-            # Export converted audio
-            audio.export(output_path, format=self.target_format)
+            output_path = cache_path or input_path.rsplit('.', 1)[0] + '_converted.wav'
+            
+            # Resample, downmix and encode in one ffmpeg pass, renaming into
+            # place so a half-written file is never picked up as a cache hit
+            temp_path = f"{output_path}.{os.getpid()}.tmp"
+            _run_ffmpeg([
+                "-i", input_path, "-vn",
+                "-ac", str(self.target_channels),
+                "-ar", str(self.target_sample_rate),
+                "-c:a", "pcm_s16le", "-f", self.target_format, temp_path
+            ])
+            os.replace(temp_path, output_path)
+            
+            if cache_path:
+                self._evict_conversion_cache(keep=output_path)
             
             st.info(f"Audio converted to optimal format: {output_path}")
             return output_path
@@ -51,18 +155,101 @@ class AudioUtils:
             st.error(f"Audio conversion error: {str(e)}")
             return input_path  # Return original if conversion fails
     
+    def _conversion_cache_path(self, input_path: str):
+        """Cache path for a converted copy, or None when caching is disabled
+        
+        Keyed on a fingerprint of the whole file and the target settings.
+        """
+        if os.getenv("AUDIO_CACHE_DISABLE") == "1":
+            return None
+        
+        fingerprint = self.get_audio_fingerprint(input_path)
+        if not fingerprint:
+            return None
+        
+        os.makedirs(_AUDIO_CACHE_DIR, exist_ok=True)
+        return os.path.join(
+            _AUDIO_CACHE_DIR,
+            f"{fingerprint}_{self.target_sample_rate}_{self.target_channels}.{self.target_format}"
+        )
+    
+    def _evict_conversion_cache(self, keep: str = None):
+        """Delete least recently used conversions beyond AUDIO_CACHE_MAX_MB (default 2 GB)"""
+        max_bytes = int(os.getenv("AUDIO_CACHE_MAX_MB", "2048")) * 1024 * 1024
+        
+        entries = []
+        for entry in os.scandir(_AUDIO_CACHE_DIR):
+            if entry.is_file() and not entry.name.endswith('.tmp') and entry.path != keep:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+    
+    def is_cached_conversion(self, path: str) -> bool:
+        """Whether path is a converted copy owned by the conversion cache"""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(_AUDIO_CACHE_DIR)
+    
+    def decode(self, file_path: str) -> DecodedAudio:
+        """Decode a file to 16-bit PCM, for passing to several processing methods
+        
+        Nothing is cached; callers hold the result only as long as they need it.
+        """
+        from pydub import AudioSegment
+        audio = AudioSegment.from_file(file_path).set_sample_width(2)
+        samples = np.frombuffer(audio.raw_data, dtype=np.int16).reshape(-1, audio.channels)
+        return DecodedAudio(samples, audio.frame_rate, audio.channels)
+    
+    def _probe(self, file_path: str) -> dict:
+        """Read container and stream metadata with ffprobe, without decoding"""
+        output = subprocess.check_output([
+            _FFPROBE, "-v", "error", "-print_format", "json",
+            "-show_format", "-show_streams", file_path
+        ])
+        return json.loads(output)
+    
+    def _audio_stream(self, probe: dict) -> dict:
+        """First audio stream in ffprobe output"""
+        for stream in probe.get('streams', []):
+            if stream.get('codec_type') == 'audio':
+                return stream
+        raise ValueError("No audio stream found")
+    
+    def _max_volume_db(self, file_path: str) -> float:
+        """Peak level in dBFS from ffmpeg's volumedetect, streamed with no Python buffer
+        
+        Digital silence reports -91 dB (the 16-bit floor) or -inf.
+        """
+        result = subprocess.run(
+            [_FFMPEG, "-nostdin", "-hide_banner", "-i", file_path,
+             "-vn", "-af", "volumedetect", "-f", "null", "-"],
+            capture_output=True
+        )
+        match = re.search(rb"max_volume:\s*(-?(?:inf|[\d.]+)) dB", result.stderr)
+        if not match:
+            raise RuntimeError("Could not measure audio volume")
+        return float(match.group(1))
+    
     def get_audio_info(self, file_path: str) -> dict:
         """Get audio file information"""
         try:
-            audio = AudioSegment.from_file(file_path)
+            probe = self._probe(file_path)
+            stream = self._audio_stream(probe)
             
             return {
-                'duration': len(audio) / 1000.0,  # Duration in seconds
-                'sample_rate': audio.frame_rate,
-                'channels': audio.channels,
+                'duration': float(probe['format'].get('duration', 0)),  # Duration in seconds
+                'sample_rate': int(stream.get('sample_rate', 0)),
+                'channels': stream.get('channels', 0),
                 'format': file_path.split('.')[-1].lower(),
                 'file_size': os.path.getsize(file_path),
-                'bitrate': audio.frame_rate * audio.frame_width * 8 * audio.channels
+                'bitrate': int(stream.get('bit_rate') or probe['format'].get('bit_rate') or 0)
             }
             
         except Exception as e:
@@ -78,21 +265,23 @@ class AudioUtils:
                 st.error(f"Unsupported audio format: {file_extension}")
                 return False
             
-            # Try to load audio file
-            audio = AudioSegment.from_file(file_path)
+            # Read the duration from the header instead of decoding the file
+            probe = self._probe(file_path)
+            self._audio_stream(probe)
+            duration = float(probe['format'].get('duration', 0))
             
             # Check minimum duration (5 seconds)
-            if len(audio) < 5000:
+            if duration < 5:
                 st.error("Audio file too short (minimum 5 seconds required)")
                 return False
             
             # Check maximum duration (2 hours)
-            if len(audio) > 7200000:  # 2 hours in milliseconds
+            if duration > 7200:
                 st.error("Audio file too long (maximum 2 hours)")
                 return False
             
             # Check if audio has content (not silent)
-            if audio.max_possible_amplitude == 0:
+            if self._max_volume_db(file_path) <= -90:
                 st.error("Audio file appears to be silent")
                 return False
             
@@ -102,28 +291,21 @@ class AudioUtils:
             st.error(f"Audio validation error: {str(e)}")
             return False
     
-    def enhance_audio_quality(self, file_path: str) -> str:
+    def enhance_audio_quality(self, file_path: str, decoded: DecodedAudio = None) -> str:
         """Enhance audio quality for better transcription"""
         try:
-            audio = AudioSegment.from_file(file_path)
-            
-            # Normalize audio levels
-            audio = audio.normalize()
-            
-            # Apply high-pass filter to reduce low-frequency noise
-            audio = audio.high_pass_filter(80)
-            
-            # Apply low-pass filter to reduce high-frequency noise
-            audio = audio.low_pass_filter(8000)
-            
-            # Compress dynamic range slightly
-            audio = audio.compress_dynamic_range()
-            
             # Generate output path
             output_path = file_path.rsplit('.', 1)[0] + '_enhanced.wav'
             
-            # Export enhanced audio
-            audio.export(output_path, format='wav')
+            # One ffmpeg pass: normalize levels, cut low- and high-frequency
+            # noise, then compress the dynamic range slightly
+            filters = ",".join(["dynaudnorm", *_BANDPASS_FILTERS, _COMPRESSOR_FILTER])
+            if decoded is not None:
+                # Feed the already decoded samples instead of decoding the file again
+                _run_ffmpeg([*decoded.ffmpeg_input(), "-af", filters, "-f", "wav", output_path],
+                            input=decoded.samples.tobytes())
+            else:
+                _run_ffmpeg(["-i", file_path, "-vn", "-af", filters, "-f", "wav", output_path])
             
             st.info("Audio quality enhanced for better transcription")
             return output_path
@@ -132,6 +314,46 @@ class AudioUtils:
             st.error(f"Audio enhancement error: {str(e)}")
             return file_path  # Return original if enhancement fails
     
+    def pipeline(self, input_path: str, *, resample: bool = True, denoise: bool = True,
+                 trim_silence: bool = True, thumbnail_seconds: int = None,
+                 silence_threshold: int = -40) -> str:
+        """Convert, enhance, remove silence and trim in a single ffmpeg pass
+        
+        Equivalent to chaining convert_to_supported_format,
+        enhance_audio_quality, remove_silence and create_audio_thumbnail,
+        but the input is decoded once and no intermediate files are written.
+        """
+        try:
+            filters = []
+            if denoise:
+                filters.extend(_BANDPASS_FILTERS)
+            if trim_silence:
+                # Same rule as remove_silence: pauses of 1 s or more shrink to 200 ms
+                filters.append(
+                    "silenceremove=stop_periods=-1:stop_duration=1:"
+                    f"stop_threshold={silence_threshold}dB:stop_silence=0.2:detection=rms"
+                )
+            if denoise:
+                # Normalize after trimming so quiet pauses are not boosted into speech
+                filters.extend(["dynaudnorm", _COMPRESSOR_FILTER])
+            
+            args = ["-i", input_path, "-vn"]
+            if filters:
+                args += ["-af", ",".join(filters)]
+            if resample:
+                args += ["-ac", str(self.target_channels), "-ar", str(self.target_sample_rate)]
+            if thumbnail_seconds:
+                args += ["-t", str(thumbnail_seconds)]
+            
+            output_path = input_path.rsplit('.', 1)[0] + '_processed.wav'
+            _run_ffmpeg([*args, "-c:a", "pcm_s16le", "-f", "wav", output_path])
+            
+            return output_path
+            
+        except Exception as e:
+            st.error(f"Audio processing error: {str(e)}")
+            return input_path
+    
     def split_audio_by_size(self, file_path: str, max_size_mb: int = 25) -> list:
         """Split audio file into smaller chunks if it exceeds size limit"""
         try:
@@ -140,26 +362,30 @@ class AudioUtils:
             if file_size_mb <= max_size_mb:
                 return [file_path]
             
-            audio = AudioSegment.from_file(file_path)
+            duration = float(self._probe(file_path)['format']['duration'])
             
             # Calculate chunk duration based on size
-            chunk_duration = (max_size_mb / file_size_mb) * len(audio)
-            chunk_duration = int(chunk_duration * 0.9)  # 10% safety margin
-            
-            chunks = []
-            chunk_paths = []
-            
-            # Split audio into chunks
-            for i in range(0, len(audio), chunk_duration):
-                chunk = audio[i:i + chunk_duration]
-                chunks.append(chunk)
-            
-            # Export chunks
-            base_name = file_path.rsplit('.', 1)[0]
-            for i, chunk in enumerate(chunks):
-                chunk_path = f"{base_name}_chunk_{i+1}.wav"
-                chunk.export(chunk_path, format='wav')
-                chunk_paths.append(chunk_path)
+            chunk_duration = (max_size_mb / file_size_mb) * duration
+            chunk_duration = chunk_duration * 0.9  # 10% safety margin
+            
+            # Stream-copy each chunk in the source codec, so chunk sizes stay
+            # proportional to the source and under the limit
+            base_name, extension = file_path.rsplit('.', 1)
+            jobs = []
+            start = 0.0
+            while start < duration:
+                chunk_path = f"{base_name}_chunk_{len(jobs)+1}.{extension}"
+                jobs.append([
+                    "-ss", f"{start:.3f}", "-t", f"{chunk_duration:.3f}",
+                    "-i", file_path, "-vn", "-c", "copy", chunk_path
+                ])
+                start += chunk_duration
+            
+            # Each ffmpeg seeks straight to its chunk; threads only wait on the subprocesses
+            with ThreadPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as executor:
+                list(executor.map(_run_ffmpeg, jobs))
+            
+            chunk_paths = [job[-1] for job in jobs]
             
             st.info(f"Audio split into {len(chunk_paths)} chunks for processing")
             return chunk_paths
@@ -168,30 +394,58 @@ class AudioUtils:
             st.error(f"Audio splitting error: {str(e)}")
             return [file_path]
     
-    def remove_silence(self, file_path: str, silence_threshold: int = -40) -> str:
+    def remove_silence(self, file_path: str, silence_threshold: int = -40,
+                       decoded: DecodedAudio = None) -> str:
         """Remove silence from audio file"""
         try:
-            audio = AudioSegment.from_file(file_path)
-            
-            # Split audio by silence
-            chunks = AudioSegment.split_on_silence(
-                audio,
-                min_silence_len=1000,  # 1 second
-                silence_thresh=silence_threshold,
-                keep_silence=200  # Keep 200ms of silence
-            )
-            
-            # Combine non-silent chunks
-            if chunks:
-                combined = AudioSegment.empty()
-                for chunk in chunks:
-                    combined += chunk
+            audio = decoded or self.decode(file_path)
+            
+            min_silence_len = 1000  # 1 second
+            keep_silence = 200  # Keep 200ms of silence
+            
+            # RMS level of every 10 ms frame, computed over all channels at once
+            frame = max(1, audio.sample_rate // 100)
+            samples = audio.samples.ravel()
+            frame_len = frame * audio.channels
+            n_frames = len(samples) // frame_len
+            frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+            
+            # Square in float32 a block at a time; the int16 samples are never
+            # copied whole, and never upcast to float64
+            power = np.empty(n_frames, dtype=np.float32)
+            for start in range(0, n_frames, _POWER_BLOCK_FRAMES):
+                block = frames[start:start + _POWER_BLOCK_FRAMES].astype(np.float32)
+                block *= block
+                power[start:start + len(block)] = block.mean(axis=1)
+            level_db = 10 * np.log10(np.maximum(power, 1e-10)) - 20 * np.log10(32768)
+            loud = level_db > silence_threshold
+            
+            if loud.any():
+                # Find runs of silent frames from the edges of the mask
+                silent = np.concatenate(([False], ~loud, [False])).astype(np.int8)
+                edges = np.flatnonzero(np.diff(silent))
+                starts, ends = edges[0::2], edges[1::2]
+                
+                # Drop long pauses, except keep_silence at either side of them
+                long_runs = (ends - starts) * 10 >= min_silence_len
+                keep_frames = keep_silence // 10
+                drop_delta = np.zeros(n_frames + 1, dtype=np.int32)
+                np.add.at(drop_delta, starts[long_runs] + keep_frames, 1)
+                np.add.at(drop_delta, ends[long_runs] - keep_frames, -1)
+                keep = np.cumsum(drop_delta[:-1]) == 0
+                
+                # One boolean gather builds the output buffer; the partial
+                # frame at the end is always kept
+                kept = np.concatenate((
+                    frames[keep].ravel(),
+                    samples[n_frames * frame_len:]
+                ))
                 
                 # Generate output path
                 output_path = file_path.rsplit('.', 1)[0] + '_no_silence.wav'
                 
                 # Export processed audio
-                combined.export(output_path, format='wav')
+                _write_wav(output_path, kept, audio.sample_rate, audio.channels)
                 
                 st.info("Silence removed from audio")
                 return output_path
@@ -206,14 +460,11 @@ class AudioUtils:
     def extract_audio_from_video(self, video_path: str) -> str:
         """Extract audio from video file"""
         try:
-            # Load video file
-            video = AudioSegment.from_file(video_path)
-            
             # Generate output path
             output_path = video_path.rsplit('.', 1)[0] + '_extracted_audio.wav'
             
-            # Export audio
-            video.export(output_path, format='wav')
+            # Drop the video stream and decode only the audio
+            _run_ffmpeg(["-i", video_path, "-vn", "-c:a", "pcm_s16le", "-f", "wav", output_path])
             
             st.info("Audio extracted from video file")
             return output_path
@@ -222,36 +473,57 @@ class AudioUtils:
             st.error(f"Audio extraction error: {str(e)}")
             return video_path
     
-    def get_audio_segments(self, file_path: str, segment_duration: int = 30) -> list:
-        """Split audio into segments of specified duration"""
+    def get_audio_segments(self, file_path: str, segment_duration: int = 30,
+                           decoded: DecodedAudio = None, overlap: int = 1) -> list:
+        """Split audio into segments of specified duration, each overlapping the previous one"""
         try:
-            audio = AudioSegment.from_file(file_path)
-            segment_duration_ms = segment_duration * 1000
-            
-            segments = []
-            for i in range(0, len(audio), segment_duration_ms):
-                segment = audio[i:i + segment_duration_ms]
-                segments.append(segment)
-            
-            return segments
+            audio = decoded or self.decode(file_path)
+            ranges = chunk_ranges(len(audio.samples), audio.sample_rate, segment_duration, overlap)
+            return [audio.segment(start, end) for start, end in ranges]
             
         except Exception as e:
             st.error(f"Audio segmentation error: {str(e)}")
             return []
     
-    def create_audio_thumbnail(self, file_path: str, duration: int = 30) -> str:
-        """Create short audio thumbnail for preview"""
+    def get_audio_batch(self, file_path: str, segment_duration: int = 30,
+                        decoded: DecodedAudio = None, overlap: int = 1):
+        """Overlapping segments packed into one zero-padded array for batched inference
+        
+        Returns (batch, ranges): batch is int16 of shape
+        (segments, segment frames, channels) and ranges holds each
+        segment's (start, end) frame in the recording.
+        """
         try:
-            audio = AudioSegment.from_file(file_path)
+            audio = decoded or self.decode(file_path)
+            ranges = chunk_ranges(len(audio.samples), audio.sample_rate, segment_duration, overlap)
+            
+            # Same window length chunk_ranges uses, so fractional durations work
+            window = int(segment_duration * audio.sample_rate)
+            batch = np.zeros((len(ranges), window, audio.channels), dtype=np.int16)
+            for row, (start, end) in zip(batch, ranges):
+                row[:end - start] = audio.samples[start:end]
             
-            # Take first 30 seconds
-            thumbnail = audio[:duration * 1000]
+            return batch, ranges
             
+        except Exception as e:
+            st.error(f"Audio segmentation error: {str(e)}")
+            return None, []
+    
+    def create_audio_thumbnail(self, file_path: str, duration: int = 30,
+                               decoded: DecodedAudio = None) -> str:
+        """Create short audio thumbnail for preview"""
+        try:
             # Generate output path
             output_path = file_path.rsplit('.', 1)[0] + '_thumbnail.wav'
             
-            # Export thumbnail
-            thumbnail.export(output_path, format='wav')
+            if decoded is not None:
+                # Already decoded: write the first frames straight out as WAV
+                _write_wav(output_path, decoded.samples[:duration * decoded.sample_rate],
+                           decoded.sample_rate, decoded.channels)
+                return output_path
+            
+            # Take first 30 seconds; ffmpeg stops reading once it has them
+            _run_ffmpeg(["-i", file_path, "-vn", "-t", str(duration), "-f", "wav", output_path])
             
             return output_path
             
@@ -272,17 +544,27 @@ class AudioUtils:
     def get_audio_fingerprint(self, file_path: str) -> str:
         """Generate audio fingerprint for duplicate detection"""
         try:
-            import hashlib
-            
-            # Read audio file in chunks and hash
-            hasher = hashlib.md5()
-            
             with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hasher.update(chunk)
+                size = os.fstat(f.fileno()).st_size
+                if blake3 is not None:
+                    # BLAKE3 hashes across all cores for very large recordings
+                    hasher = blake3(max_threads=blake3.AUTO if size > 1 << 30 else 1)
+                else:
+                    hasher = hashlib.blake2b(digest_size=32)
+                
+                # mmap lets the kernel handle readahead; it cannot map empty files
+                if size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        hasher.update(mm)
             
             return hasher.hexdigest()
             
         except Exception as e:
             st.error(f"Fingerprint generation error: {str(e)}")
             return ""
+
+
+@lru_cache(maxsize=None)
+def get_audio_utils() -> AudioUtils:
+    """Process-wide AudioUtils instance"""
+    return AudioUtils()
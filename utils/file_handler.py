@@ -1,5 +1,6 @@
 import os
 import tempfile
+from functools import lru_cache
 from typing import Optional
 import streamlit as st
 
@@ -39,24 +40,22 @@ class FileHandler:
             return None
     
     def _extract_text_from_pdf(self, uploaded_file) -> Optional[str]:
-        """Extract text from PDF file using PyPDF2"""
+        """Extract text from PDF file using PDFium, falling back to PyPDF2"""
         try:
-            from PyPDF2 import PdfReader
-            
             # Reset file pointer
             uploaded_file.seek(0)
             
-            pdf_reader = PdfReader(uploaded_file)
-            text_content = []
+            text_content = None
+            try:
+                text_content = self._extract_pages_pdfium(uploaded_file.read())
+            except ImportError:
+                pass
+            except Exception as e:
+                st.warning(f"PDFium could not read the PDF, retrying with PyPDF2: {str(e)}")
             
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text.strip():
-                        text_content.append(f"=== Page {page_num + 1} ===\n{page_text}")
-                except Exception as e:
-                    st.warning(f"Could not extract text from page {page_num + 1}: {str(e)}")
-                    continue
+            if text_content is None:
+                uploaded_file.seek(0)
+                text_content = self._extract_pages_pypdf2(uploaded_file)
             
             if not text_content:
                 st.error("Could not extract any readable text from the PDF.")
@@ -68,6 +67,49 @@ class FileHandler:
             st.error(f"Error processing PDF: {str(e)}")
             return None
     
+    def _extract_pages_pdfium(self, pdf_bytes: bytes) -> list:
+        """Extract page texts with PDFium's native text layer
+        
+        PDFium is not thread-safe, so pages are read one after another.
+        """
+        import pypdfium2 as pdfium
+        
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            text_content = []
+            for page_num, page in enumerate(pdf):
+                try:
+                    textpage = page.get_textpage()
+                    page_text = textpage.get_text_range().replace('\r\n', '\n')
+                    textpage.close()
+                    if page_text.strip():
+                        text_content.append(f"=== Page {page_num + 1} ===\n{page_text}")
+                except Exception as e:
+                    st.warning(f"Could not extract text from page {page_num + 1}: {str(e)}")
+                finally:
+                    page.close()
+            return text_content
+        finally:
+            pdf.close()
+    
+    def _extract_pages_pypdf2(self, uploaded_file) -> list:
+        """Extract page texts with the pure-Python PyPDF2 parser"""
+        from PyPDF2 import PdfReader
+        
+        pdf_reader = PdfReader(uploaded_file)
+        text_content = []
+        
+        for page_num, page in enumerate(pdf_reader.pages):
+            try:
+                page_text = page.extract_text()
+                if page_text.strip():
+                    text_content.append(f"=== Page {page_num + 1} ===\n{page_text}")
+            except Exception as e:
+                st.warning(f"Could not extract text from page {page_num + 1}: {str(e)}")
+                continue
+        
+        return text_content
+    
     def get_file_info(self, uploaded_file) -> dict:
         """Get information about the uploaded file"""
         return {
@@ -89,4 +131,10 @@ class FileHandler:
     
     def is_supported_text_file(self, uploaded_file) -> bool:
         """Check if file type is supported for text extraction"""
-        return uploaded_file.type in self.supported_text_types
\ No newline at end of file
+        return uploaded_file.type in self.supported_text_types
+
+
+@lru_cache(maxsize=None)
+def get_file_handler() -> FileHandler:
+    """Process-wide FileHandler instance"""
+    return FileHandler()
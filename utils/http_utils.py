@@ -0,0 +1,155 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Responses worth retrying: rate limiting and transient gateway errors
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# A gateway error does not say whether the server acted on the request, so
+# non-idempotent requests are only retried when it was certainly not processed
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+UNSENT_RETRY_STATUSES = frozenset({429})
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Read a numeric Retry-After header, if the server sent one"""
+    value = response.headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+async def request_with_backoff(client: httpx.AsyncClient, method: str, url: str,
+                               max_retries: int = 5, base_delay: float = 1.0,
+                               max_delay: float = 30.0,
+                               content_factory: Optional[Callable] = None,
+                               limiter: Optional['AdaptiveRateLimiter'] = None,
+                               idempotent: Optional[bool] = None,
+                               **kwargs) -> httpx.Response:
+    """Send a request, retrying 429/5xx and connection errors with exponential backoff
+
+    Streamed bodies can only be sent once, so pass ``content_factory`` to
+    build a fresh body for every attempt instead of ``content``. A
+    ``limiter`` paces every attempt and learns from each response.
+
+    POST and PATCH requests are only retried on 429 and on errors raised
+    before the request was sent, so a job is never submitted twice. Pass
+    ``idempotent=True`` for POSTs that are safe to repeat.
+    """
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    retry_statuses = RETRY_STATUSES if idempotent else UNSENT_RETRY_STATUSES
+    retry_errors = httpx.TransportError if idempotent else UNSENT_ERRORS
+
+    delay = base_delay
+    for attempt in range(max_retries + 1):
+        if content_factory is not None:
+            kwargs['content'] = content_factory()
+
+        try:
+            if limiter is not None:
+                await limiter.acquire()
+            response = await client.request(method, url, **kwargs)
+        except retry_errors:
+            if attempt == max_retries:
+                raise
+            wait = delay
+        else:
+            if limiter is not None:
+                limiter.record_response(response)
+            if response.status_code not in retry_statuses or attempt == max_retries:
+                return response
+            wait = _retry_after_seconds(response) or delay
+
+        # Jitter keeps concurrent callers from retrying in lockstep
+        await asyncio.sleep(min(wait, max_delay) * random.uniform(0.8, 1.2))
+        delay = min(delay * 2, max_delay)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate adapts to the provider's limits (AIMD)
+
+    The rate is halved on every 429 and grows by one request per minute
+    for each full minute without one, up to ``max_rate``. Rate-limit
+    headers, when the provider sends them, cap ``max_rate`` directly.
+    Use as ``async with limiter:`` around each request.
+    """
+
+    def __init__(self, requests_per_minute: float, min_rate: float = 1.0,
+                 burst_seconds: float = 10.0):
+        self.max_rate = float(requests_per_minute)
+        self.min_rate = min_rate
+        self.rate = self.max_rate
+        self.burst_seconds = burst_seconds
+        self._tokens = self._capacity()
+        self._updated = time.monotonic()
+        self._window_start = self._updated
+        # Services are shared across Streamlit sessions, each on its own thread
+        self._lock = threading.Lock()
+
+    def _capacity(self) -> float:
+        return max(1.0, self.rate * self.burst_seconds / 60)
+
+    def _take(self) -> float:
+        """Take a token if one is available, else return seconds to wait"""
+        with self._lock:
+            now = time.monotonic()
+            refill = (now - self._updated) * self.rate / 60
+            self._tokens = min(self._capacity(), self._tokens + refill)
+            self._updated = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * 60 / self.rate
+
+    async def acquire(self):
+        while (wait := self._take()) > 0:
+            await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def record_response(self, response: httpx.Response):
+        """Adapt the rate to a response's status and rate-limit headers"""
+        with self._lock:
+            now = time.monotonic()
+            if response.status_code == 429:
+                self.rate = max(self.min_rate, self.rate * 0.5)
+                self._tokens = min(self._tokens, 0.0)
+                self._window_start = now
+            elif now - self._window_start >= 60:
+                self.rate = min(self.max_rate, self.rate + 1)
+                self._window_start = now
+
+            limit = _header_number(response, 'x-ratelimit-limit-requests')
+            if limit:
+                # Follow the advertised limit unless we are backing off from a 429
+                self.rate = limit if self.rate >= self.max_rate else min(self.rate, limit)
+                self.max_rate = limit
+            if _header_number(response, 'x-ratelimit-remaining-requests') == 0:
+                self._tokens = min(self._tokens, 0.0)
+
+
+def _header_number(response: httpx.Response, name: str) -> Optional[float]:
+    """Read a numeric response header, if present"""
+    try:
+        return float(response.headers[name])
+    except (KeyError, ValueError):
+        return None
@@ -1,17 +1,82 @@
 import os
+import re
+import time
+import queue
+import atexit
+import threading
+import hmac
 import base64
+import struct
+import secrets
 import hashlib
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from datetime import datetime
+from functools import lru_cache, cached_property
+from types import MappingProxyType
+from typing import Mapping
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import streamlit as st
+from utils import json_utils
+
+# Marks AES-GCM payloads; Fernet tokens are base64 text and never start with
+# either. Version 1 was keyed with the raw key, version 2 with a derived subkey
+_AESGCM_LEGACY_VERSION = b'\x01'
+_AESGCM_VERSION = b'\x02'
+_NONCE_SIZE = 12
+
+# OpenSSL-backed, so SHA-NI / ARMv8 SHA instructions are used where available
+_SHA256_PROTOTYPE = hashlib.sha256()
+
+# Session tokens: big-endian timestamp, 8-byte user prefix and a 16-byte random
+# nonce, then an HMAC-SHA256 over all three
+_TOKEN_PAYLOAD = struct.Struct('>Q8s16s')
+_TOKEN_SIZE = _TOKEN_PAYLOAD.size + hashlib.sha256().digest_size
+
+# Overwrite block for secure_delete_file
+_WIPE_BLOCK = bytes(1 << 20)
+
+_UNSAFE_FILENAME_CHARS = re.compile(r'[<>:"/\\|?*]')
+
+_SECURITY_HEADERS = MappingProxyType({
+    'X-Content-Type-Options': 'nosniff',
+    'X-Frame-Options': 'DENY',
+    'X-XSS-Protection': '1; mode=block',
+    'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
+    'Content-Security-Policy': "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline';"
+})
+
+# Sensitive data patterns and their masks, applied in this order
+_SENSITIVE_PATTERNS = [
+    # Phone numbers
+    (re.compile(r'\b\d{3}-\d{3}-\d{4}\b'), '[PHONE]'),
+    (re.compile(r'\b\(\d{3}\)\s*\d{3}-\d{4}\b'), '[PHONE]'),
+    # Email addresses
+    (re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'), '[EMAIL]'),
+    # SSNs
+    (re.compile(r'\b\d{3}-\d{2}-\d{4}\b'), '[SSN]'),
+    # Credit card numbers
+    (re.compile(r'\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b'), '[CARD]'),
+]
 
 class SecurityUtils:
     """Security utilities for data encryption and HIPAA compliance"""
     
     def __init__(self):
         self.encryption_key = self._get_or_create_key()
-        self.fernet = Fernet(self.encryption_key)
+        # Each primitive gets its own subkey. Built once so the AES key
+        # schedule is not recomputed per call
+        self.aesgcm = AESGCM(hmac.new(self.encryption_key, b'aes-gcm', 'sha256').digest())
+        self.token_key = hmac.new(self.encryption_key, b'session-token', 'sha256').digest()
+    
+    @cached_property
+    def legacy_aesgcm(self):
+        """AES-GCM on the raw key, only needed to read version 1 payloads"""
+        return AESGCM(base64.urlsafe_b64decode(self.encryption_key))
+    
+    @cached_property
+    def fernet(self):
+        """Fernet cipher, only needed to read data saved before AES-GCM"""
+        from cryptography.fernet import Fernet
+        return Fernet(self.encryption_key)
     
     def _get_or_create_key(self):
         """Get or create encryption key"""
@@ -23,6 +88,9 @@ class SecurityUtils:
                     return f.read()
             
             # Generate new key if none exists
+            from cryptography.hazmat.primitives import hashes
+            from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+            
             password = os.getenv('ENCRYPTION_PASSWORD', 'default_therapeutic_key_2024').encode()
             salt = os.getenv('ENCRYPTION_SALT', 'therapeutic_salt_2024').encode()
             
@@ -43,31 +111,49 @@ class SecurityUtils:
         except Exception as e:
             st.error(f"Encryption key generation error: {str(e)}")
             # Fallback to simple key generation
+            from cryptography.fernet import Fernet
             return Fernet.generate_key()
     
-    def encrypt_data(self, data: str) -> bytes:
-        """Encrypt sensitive data"""
+    def encrypt_data(self, data: bytes) -> bytes:
+        """Encrypt sensitive data with AES-256-GCM"""
         try:
             if isinstance(data, str):
                 data = data.encode('utf-8')
-            return self.fernet.encrypt(data)
+            nonce = os.urandom(_NONCE_SIZE)
+            # One join instead of two concatenations, so the ciphertext is copied once
+            return b''.join((_AESGCM_VERSION, nonce, self.aesgcm.encrypt(nonce, data, None)))
         except Exception as e:
             st.error(f"Encryption error: {str(e)}")
             return data.encode('utf-8') if isinstance(data, str) else data
     
-    def decrypt_data(self, encrypted_data: bytes) -> str:
-        """Decrypt sensitive data"""
+    def decrypt_data(self, encrypted_data: bytes, raise_errors: bool = False) -> bytes:
+        """Decrypt sensitive data (AES-GCM, or Fernet for data saved before)
+
+        raise_errors re-raises failures instead of reporting them, for callers
+        off the script thread where st.error would be dropped.
+        """
         try:
-            decrypted = self.fernet.decrypt(encrypted_data)
-            return decrypted.decode('utf-8')
+            version = encrypted_data[:1]
+            if version in (_AESGCM_VERSION, _AESGCM_LEGACY_VERSION):
+                aesgcm = self.aesgcm if version == _AESGCM_VERSION else self.legacy_aesgcm
+                # Slice through a memoryview so large payloads are not copied
+                view = memoryview(encrypted_data)
+                return aesgcm.decrypt(view[1:1 + _NONCE_SIZE], view[1 + _NONCE_SIZE:], None)
+            return self.fernet.decrypt(encrypted_data)
         except Exception as e:
+            if raise_errors:
+                raise
             st.error(f"Decryption error: {str(e)}")
-            return encrypted_data.decode('utf-8') if isinstance(encrypted_data, bytes) else str(encrypted_data)
+            return encrypted_data if isinstance(encrypted_data, bytes) else str(encrypted_data).encode('utf-8')
     
     def hash_data(self, data: str) -> str:
         """Create hash for data integrity"""
         try:
-            return hashlib.sha256(data.encode('utf-8')).hexdigest()
+            # Copying a primed hasher skips the OpenSSL constructor lookup;
+            # bytes-like input is hashed in place without an extra copy
+            hasher = _SHA256_PROTOTYPE.copy()
+            hasher.update(data.encode('utf-8') if isinstance(data, str) else memoryview(data))
+            return hasher.hexdigest()
         except Exception as e:
             st.error(f"Hashing error: {str(e)}")
             return data
@@ -76,8 +162,7 @@ class SecurityUtils:
         """Sanitize filename for secure storage"""
         try:
             # Remove potentially dangerous characters
-            import re
-            sanitized = re.sub(r'[<>:"/\\|?*]', '_', filename)
+            sanitized = _UNSAFE_FILENAME_CHARS.sub('_', filename)
             # Limit length
             sanitized = sanitized[:100]
             # Ensure it's not empty
@@ -104,10 +189,13 @@ class SecurityUtils:
                 # Get file size
                 file_size = os.path.getsize(filepath)
                 
-                # Overwrite with random data
-                with open(filepath, 'rb+') as f:
-                    f.write(os.urandom(file_size))
-                    f.flush()
+                # Overwrite in place with one reused block of zeros, so memory
+                # stays at 1 MiB and no random bytes are generated
+                with open(filepath, 'rb+', buffering=0) as f:
+                    view = memoryview(_WIPE_BLOCK)
+                    remaining = file_size
+                    while remaining > 0:
+                        remaining -= f.write(view[:min(remaining, len(_WIPE_BLOCK))])
                     os.fsync(f.fileno())
                 
                 # Delete file
@@ -133,16 +221,11 @@ class SecurityUtils:
     def generate_session_token(self, user_id: str = None) -> str:
         """Generate secure session token"""
         try:
-            import secrets
-            import time
-            
-            # Create token with timestamp and random data
-            timestamp = str(int(time.time()))
-            random_data = secrets.token_hex(16)
-            user_part = user_id[:8] if user_id else 'anonymous'
-            
-            token_data = f"{timestamp}:{user_part}:{random_data}"
-            return base64.urlsafe_b64encode(token_data.encode()).decode()
+            # Timestamp, user prefix and nonce, signed so the token cannot be forged
+            user_part = (user_id or 'anonymous').encode('utf-8')[:8]
+            payload = _TOKEN_PAYLOAD.pack(int(time.time()), user_part, secrets.token_bytes(16))
+            signature = hmac.new(self.token_key, payload, 'sha256').digest()
+            return base64.urlsafe_b64encode(payload + signature).decode()
             
         except Exception as e:
             st.error(f"Token generation error: {str(e)}")
@@ -151,23 +234,19 @@ class SecurityUtils:
     def validate_session_token(self, token: str, max_age_hours: int = 24) -> bool:
         """Validate session token"""
         try:
-            import time
-            
             # Decode token
-            token_data = base64.urlsafe_b64decode(token).decode()
-            parts = token_data.split(':')
-            
-            if len(parts) != 3:
+            raw = base64.urlsafe_b64decode(token)
+            if len(raw) != _TOKEN_SIZE:
                 return False
             
-            timestamp = int(parts[0])
-            current_time = int(time.time())
-            
-            # Check if token is expired
-            if current_time - timestamp > max_age_hours * 3600:
+            payload = raw[:_TOKEN_PAYLOAD.size]
+            expected = hmac.new(self.token_key, payload, 'sha256').digest()
+            if not hmac.compare_digest(raw[_TOKEN_PAYLOAD.size:], expected):
                 return False
             
-            return True
+            # Check if token is expired
+            timestamp, _, _ = _TOKEN_PAYLOAD.unpack(payload)
+            return int(time.time()) - timestamp <= max_age_hours * 3600
             
         except Exception as e:
             st.error(f"Token validation error: {str(e)}")
@@ -176,23 +255,21 @@ class SecurityUtils:
     def audit_log(self, action: str, details: dict = None):
         """Create audit log entry for HIPAA compliance"""
         try:
-            import json
-            from datetime import datetime
+            if _audit_writer.error is not None:
+                error, _audit_writer.error = _audit_writer.error, None
+                st.error(f"Audit logging error: {str(error)}")
             
+            timestamp = datetime.now().isoformat()
             log_entry = {
-                'timestamp': datetime.now().isoformat(),
+                'timestamp': timestamp,
                 'action': action,
                 'details': details or {},
                 'session_id': st.session_state.get('session_id', 'unknown')
             }
             
-            # Create logs directory if it doesn't exist
-            os.makedirs('logs', exist_ok=True)
-            
-            # Append to audit log
-            log_file = f"logs/audit_{datetime.now().strftime('%Y%m')}.log"
-            with open(log_file, 'a') as f:
-                f.write(json.dumps(log_entry) + '\n')
+            # Serialized here so a bad entry is reported to the caller; the
+            # background writer only appends the line to the monthly file
+            _audit_writer.put(timestamp, json_utils.dumps(log_entry) + b'\n')
                 
         except Exception as e:
             st.error(f"Audit logging error: {str(e)}")
@@ -200,20 +277,8 @@ class SecurityUtils:
     def clean_sensitive_data(self, data: str) -> str:
         """Remove or mask sensitive information from data"""
         try:
-            import re
-            
-            # Remove potential phone numbers
-            data = re.sub(r'\b\d{3}-\d{3}-\d{4}\b', '[PHONE]', data)
-            data = re.sub(r'\b\(\d{3}\)\s*\d{3}-\d{4}\b', '[PHONE]', data)
-            
-            # Remove potential email addresses
-            data = re.sub(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', '[EMAIL]', data)
-            
-            # Remove potential SSNs
-            data = re.sub(r'\b\d{3}-\d{2}-\d{4}\b', '[SSN]', data)
-            
-            # Remove potential credit card numbers
-            data = re.sub(r'\b\d{4}[\s-]?\d{4}[\s-]?\d{4}[\s-]?\d{4}\b', '[CARD]', data)
+            for pattern, mask in _SENSITIVE_PATTERNS:
+                data = pattern.sub(mask, data)
             
             return data
             
@@ -221,12 +286,83 @@ class SecurityUtils:
             st.error(f"Data cleaning error: {str(e)}")
             return data
     
-    def get_security_headers(self) -> dict:
-        """Get security headers for API requests"""
-        return {
-            'X-Content-Type-Options': 'nosniff',
-            'X-Frame-Options': 'DENY',
-            'X-XSS-Protection': '1; mode=block',
-            'Strict-Transport-Security': 'max-age=31536000; includeSubDomains',
-            'Content-Security-Policy': "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline';"
-        }
+    def get_security_headers(self) -> Mapping[str, str]:
+        """Get security headers for API requests (read-only; copy with dict() to modify)"""
+        return _SECURITY_HEADERS
+
+
+class _AuditLogWriter:
+    """Background thread appending queued audit entries to the monthly log files"""
+    
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._files = {}
+        # Last write failure, reported by the next audit_log call
+        self.error = None
+    
+    def put(self, timestamp: str, line: bytes):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+        self._queue.put((timestamp, line))
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            lines = {}
+            for entry in batch:
+                if entry is None:
+                    continue
+                timestamp, line = entry
+                log_file = f"logs/audit_{timestamp[:4]}{timestamp[5:7]}.log"
+                lines.setdefault(log_file, []).append(line)
+            
+            for log_file, entries in lines.items():
+                try:
+                    self._write(log_file, b''.join(entries))
+                except Exception as e:
+                    self.error = e
+            
+            if None in batch:
+                for f in self._files.values():
+                    f.close()
+                self._files.clear()
+                return
+    
+    def _write(self, log_file: str, data: bytes):
+        f = self._files.get(log_file)
+        if f is None:
+            # Keep only the current month's file open
+            for old in self._files.values():
+                old.close()
+            self._files.clear()
+            os.makedirs(os.path.dirname(log_file), exist_ok=True)
+            f = self._files[log_file] = open(log_file, 'ab')
+        f.write(data)
+        f.flush()
+    
+    def close(self):
+        """Write out queued entries and stop the writer"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+
+_audit_writer = _AuditLogWriter()
+
+
+@lru_cache(maxsize=None)
+def get_security_utils() -> SecurityUtils:
+    """Process-wide SecurityUtils, so the key is loaded or derived only once"""
+    return SecurityUtils()